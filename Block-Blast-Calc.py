@@ -1,30 +1,53 @@
 # Block Blast Calc by Kozurito
+import argparse
 import pygame
 import sys
 import copy
-import itertools
+import threading
+from solver import GRID_SIZE, MAX_BLOCK_SIZE, SearchProgress, TopPlacements, place_block, clear_lines, remove_blank_lines, find_best_placement
+
+# Board size and blocks per deal, for game variants, and how long a search may take
+parser = argparse.ArgumentParser(description="Block Blast Calc")
+parser.add_argument("--width", type=int, default=GRID_SIZE, help=f"board width in cells (default {GRID_SIZE})")
+parser.add_argument("--height", type=int, help="board height in cells (default the width)")
+parser.add_argument("--pieces", type=int, default=3, help="blocks per deal (default 3)")
+parser.add_argument("--time-budget", type=float, default=10, help="seconds to search before showing the best moves found so far, 0 for no limit (default 10)")
+args = parser.parse_args()
+if args.height is None:
+    args.height = args.width
+if min(args.width, args.height) < MAX_BLOCK_SIZE or args.pieces < 1:
+    parser.error(f"the board must be at least {MAX_BLOCK_SIZE}x{MAX_BLOCK_SIZE} and a deal needs at least one block")
+if args.time_budget < 0:
+    parser.error("the time budget can't be negative")
 
 # Initialize pygame
 pygame.init()
 
 # Constants
-GRID_SIZE = 8
+BOARD_WIDTH = args.width
+BOARD_HEIGHT = args.height
+PIECES = args.pieces
 CELL_SIZE = 50
-MAX_BLOCK_SIZE = 5
-SCREEN_WIDTH = CELL_SIZE * GRID_SIZE + 200
-SCREEN_HEIGHT = CELL_SIZE * GRID_SIZE + 500
+SCREEN_WIDTH = CELL_SIZE * BOARD_WIDTH + 200
+SCREEN_HEIGHT = CELL_SIZE * BOARD_HEIGHT + 500
 BLOCK_COLORS = (255, 100, 100)
 GRID_COLOR = (50, 50, 50)
 FILLED_COLOR = (100, 100, 255)
 HIGHLIGHT_COLOR = (255, 255, 100)
 CURRENT_BLOCK_COLOR = (255, 100, 100)
+BACKGROUND_COLOR = (0, 0, 0)
+BUTTON_COLOR = (200, 200, 200)
+TEXT_COLOR = (255, 255, 255)
+FPS = 30 # Frame rate cap, the window only redraws what changed
+SEARCH_TIME_BUDGET = args.time_budget or None # Seconds to search before showing the best moves found so far (None for no limit)
+TOP_PLANS = 5 # Distinct final boards to offer, best first
 
 # Initialize screen
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
 pygame.display.set_caption("Block Blast Calc")
 
 # Initialize grid and blocks
-grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+grid = [[0 for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
 blocks = []
 phase = "map"
 current_grid = []
@@ -34,30 +57,95 @@ current_block_height = 0
 block_index = 0
 user_input = ''
 best_moves_sequence = []
+plans = []
+plan_index = 0
+move_snapshots = []
 current_move_index = -1
+search_progress = None
+search_thread = None
+search_result = []
+
+# Layout
+NEXT_BUTTON_RECT = pygame.Rect(BOARD_WIDTH * CELL_SIZE + 25, 50, 150, 50)
+SIDE_BUTTON_RECT = pygame.Rect(BOARD_WIDTH * CELL_SIZE + 25, 125, 150, 50) # Positioned below Next button, shared by Back, Reset, Cancel, Other Plan and Show Again
+TEXT_RECT = pygame.Rect(BOARD_WIDTH * CELL_SIZE, 200, SCREEN_WIDTH - BOARD_WIDTH * CELL_SIZE, SCREEN_HEIGHT - 200)
+TRAY_RECT = pygame.Rect(0, BOARD_HEIGHT * CELL_SIZE, BOARD_WIDTH * CELL_SIZE, SCREEN_HEIGHT - BOARD_HEIGHT * CELL_SIZE)
+BUTTON_LABEL_OFFSETS = {"Next": 48, "Calculate": 20, "Back": 45, "Reset": 41, "Cancel": 35, "Other Plan": 12, "Show Again": 6} # Text x offset inside the button
 
 # Functions
-def draw_grid(surface, grid, grid_width, grid_height, offset_x=0, offset_y=0, highlight_rows=None, highlight_cols=None):
-    "Draw the grid"
-    if highlight_rows is None:
-        highlight_rows = []
-    if highlight_cols is None:
-        highlight_cols = []
-
-    for x in range(grid_width):
-        for y in range(grid_height):
-            rect = pygame.Rect((x + offset_x) * CELL_SIZE, (y + offset_y) * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            color = GRID_COLOR
-            if y in highlight_rows or x in highlight_cols: # Highlight the row or column
-                color = HIGHLIGHT_COLOR
-            pygame.draw.rect(surface, color, rect, 1)
-            if grid[y][x] == 1: # Draw a filled cell if the grid value is 1
-                pygame.draw.rect(surface, FILLED_COLOR, rect)
+def make_cell_sprite(fill_color=None, outline_color=None):
+    "Pre-render one cell: an outlined empty cell, a solid filled cell, or blank"
+    sprite = pygame.Surface((CELL_SIZE, CELL_SIZE)).convert()
+    sprite.fill(BACKGROUND_COLOR)
+    if outline_color is not None:
+        pygame.draw.rect(sprite, outline_color, sprite.get_rect(), 1)
+    if fill_color is not None:
+        sprite.fill(fill_color)
+    return sprite
+
+def make_button_sprite(label):
+    "Pre-render a button with its label"
+    sprite = pygame.Surface(SIDE_BUTTON_RECT.size).convert()
+    sprite.fill(BUTTON_COLOR)
+    sprite.blit(BUTTON_FONT.render(label, True, (0, 0, 0)), (BUTTON_LABEL_OFFSETS[label], 13))
+    return sprite
+
+# Pre-rendered fonts and sprites, built once
+BUTTON_FONT = pygame.font.SysFont(None, 36)
+TEXT_FONT = pygame.font.SysFont(None, 32)
+CELL_SPRITES = {
+    None: make_cell_sprite(),
+    "empty": make_cell_sprite(outline_color=GRID_COLOR),
+    "highlight": make_cell_sprite(outline_color=HIGHLIGHT_COLOR),
+    "filled": make_cell_sprite(fill_color=FILLED_COLOR),
+    "current": make_cell_sprite(fill_color=CURRENT_BLOCK_COLOR),
+    "block": make_cell_sprite(fill_color=BLOCK_COLORS),
+}
+BUTTON_SPRITES = {label: make_button_sprite(label) for label in BUTTON_LABEL_OFFSETS}
+
+# What is currently on screen, so each frame only redraws what changed
+drawn_cells = {}
+drawn_regions = {}
+
+def grid_sprites(grid, grid_width, grid_height, highlight_rows=(), highlight_cols=(), current_cells=()):
+    "Work out which sprite every board cell should show"
+    sprites = {}
+    for x in range(BOARD_WIDTH):
+        for y in range(BOARD_HEIGHT):
+            if x >= grid_width or y >= grid_height: # Outside the grid being edited
+                sprites[x, y] = None
+            elif (x, y) in current_cells: # The block being placed in the current move
+                sprites[x, y] = "current"
+            elif grid[y][x] == 1:
+                sprites[x, y] = "filled"
+            elif y in highlight_rows or x in highlight_cols: # Highlight the row or column
+                sprites[x, y] = "highlight"
+            else:
+                sprites[x, y] = "empty"
+    return sprites
+
+def draw_cells(sprites):
+    "Blit the cells whose sprite changed, returns the dirty rectangles"
+    dirty_rects = []
+    for (x, y), sprite in sprites.items():
+        if drawn_cells.get((x, y), "unset") != sprite:
+            drawn_cells[x, y] = sprite
+            dirty_rects.append(screen.blit(CELL_SPRITES[sprite], (x * CELL_SIZE, y * CELL_SIZE)))
+    return dirty_rects
+
+def draw_button(region, rect, label):
+    "Blit a button if its label changed (None hides it), returns the dirty rectangles"
+    if drawn_regions.get(region, "unset") == label:
+        return []
+    drawn_regions[region] = label
+    if label is None:
+        return [screen.fill(BACKGROUND_COLOR, rect)]
+    return [screen.blit(BUTTON_SPRITES[label], rect)]
 
 def draw_blocks(surface, blocks):
     "Draw the blocks at the bottom of the screen, wrapping if necessary"
     x_offset = 20
-    y_offset = GRID_SIZE * CELL_SIZE + 20
+    y_offset = BOARD_HEIGHT * CELL_SIZE + 20
     max_width = SCREEN_WIDTH - 40 # Maximum width available for blocks
 
     for block in blocks:
@@ -69,153 +157,37 @@ def draw_blocks(surface, blocks):
         for row_index, row in enumerate(block):
             for col_index, cell in enumerate(row):
                 if cell == 1:
-                    rect = pygame.Rect(
-                        x_offset + col_index * CELL_SIZE,
-                        y_offset + row_index * CELL_SIZE,
-                        CELL_SIZE,
-                        CELL_SIZE,
-                    )
-                    pygame.draw.rect(surface, BLOCK_COLORS, rect)
+                    surface.blit(CELL_SPRITES["block"], (x_offset + col_index * CELL_SIZE, y_offset + row_index * CELL_SIZE))
         x_offset += (len(block[0]) + 1) * CELL_SIZE + 25 # Move to the right for the next block
 
-def can_place_block(grid, block, x, y):
-    "Check if a block can be placed at the given position"
-    for row_index, row in enumerate(block):
-        for col_index, cell in enumerate(row):
-            if cell == 1:
-                grid_x = x + col_index
-                grid_y = y + row_index
-
-                if (grid_x < 0 or grid_x >= GRID_SIZE or
-                    grid_y < 0 or grid_y >= GRID_SIZE or
-                    (grid and grid_y < GRID_SIZE and grid_x < GRID_SIZE and grid[grid_y][grid_x] == 1)): # Handle empty grid case and out of bounds after clearing
-                    return False
-    return True
-
-def place_block(grid, block, x, y):
-    "Place a block on the grid"
-    for row_index, row in enumerate(block):
-        for col_index, cell in enumerate(row):
-            if cell == 1:
-                grid[y + row_index][x + col_index] = 1
-
-def clear_lines(grid):
-    "Clear filled lines (rows and columns) in-place"
-    rows_to_clear = []
-    cols_to_clear = []
-
-    # Identify rows to clear
-    for y in range(GRID_SIZE):
-        if all(grid[y][x] == 1 for x in range(GRID_SIZE)):
-            rows_to_clear.append(y)
-
-    # Identify columns to clear
-    for x in range(GRID_SIZE):
-        if all(grid[y][x] == 1 for y in range(GRID_SIZE)):
-            cols_to_clear.append(x)
-
-    # Clear rows (set to 0)
-    for y in rows_to_clear:
-        for x in range(GRID_SIZE):
-            grid[y][x] = 0
-
-    # Clear columns (set to 0)
-    for x in cols_to_clear:
-        for y in range(GRID_SIZE):
-            grid[y][x] = 0
-
-    return len(rows_to_clear) + len(cols_to_clear), rows_to_clear, cols_to_clear
-
-def remove_blank_lines(grid):
-    "Removes blank rows and columns to find the minimum bounding box of the blocks"
-
-    # Handle if the user doesn't enter a block
-    empty_grid = []
-    if all(all(cell == 0 for cell in row) for row in grid): 
-        return empty_grid
-
-    rows_to_remove = []
-    cols_to_remove = []
-
-    # Identify rows to remove from the top
-    for y in range(MAX_BLOCK_SIZE):
-        if all(grid[y][x] == 0 for x in range(MAX_BLOCK_SIZE)):
-            rows_to_remove.append(y)
-        else:
-            break
+def draw_info(text, tray_blocks):
+    "Redraw the message and the block tray if either changed (they can overlap), returns the dirty rectangles"
+    key = (text, repr(tray_blocks))
+    if drawn_regions.get("info") == key:
+        return []
+    drawn_regions["info"] = key
+    screen.fill(BACKGROUND_COLOR, TEXT_RECT)
+    screen.fill(BACKGROUND_COLOR, TRAY_RECT)
+    draw_blocks(screen, tray_blocks)
 
-    # Identify rows to remove from the bottom
-    for y in range(MAX_BLOCK_SIZE - 1, -1, -1): # Iterate in reverse
-        if all(grid[y][x] == 0 for x in range(MAX_BLOCK_SIZE)):
-            rows_to_remove.append(y)
-        else:
-            break
-
-    # Identify columns to remove from the left
-    for x in range(MAX_BLOCK_SIZE):
-        if all(grid[y][x] == 0 for y in range(MAX_BLOCK_SIZE)):
-            cols_to_remove.append(x)
-        else:
-            break
-    
-    # Identify columns to remove from the right
-    for x in range(MAX_BLOCK_SIZE - 1, -1, -1): # Iterate in reverse
-        if all(grid[y][x] == 0 for y in range(MAX_BLOCK_SIZE)):
-            cols_to_remove.append(x)
-        else:
-            break
-
-    # Remove rows (iterate in reverse)
-    for y in sorted(rows_to_remove, reverse=True):
-        del grid[y]
-
-    # Remove columns (iterate in reverse)
-    for row in grid:
-        for x in sorted(cols_to_remove, reverse=True):
-            del row[x]
-    
-    return grid
-    
-
-def find_best_placement(grid, blocks):
-    "Find the best placement using recursion"
-
-    def solve(current_grid, remaining_blocks, current_moves, current_score):
-        "Recursive helper function"
-        nonlocal best_score, best_move_sequence, min_remaining_units
-
-        if not remaining_blocks: # Base case: all blocks placed
-            remaining_units = sum(sum(row) for row in current_grid)
-            if current_score > best_score: # Update best score and move sequence if score is higher
-                best_score = current_score
-                best_move_sequence = current_moves
-                min_remaining_units = remaining_units
-            elif current_score == best_score and remaining_units < min_remaining_units: # Update move sequence if score is the same but remaining units are less
-                best_move_sequence = current_moves
-                min_remaining_units = remaining_units
-            return
-
-        block = remaining_blocks[0]
-        # Try placing the block in all possible positions
-        for y in range(GRID_SIZE - len(block) + 1):
-            for x in range(GRID_SIZE - len(block[0]) + 1):
-                temp_grid = copy.deepcopy(current_grid)
-                if can_place_block(temp_grid, block, x, y):
-                    place_block(temp_grid, block, x, y)
-                    lines_cleared, rows, cols = clear_lines(temp_grid)
-                    new_moves = current_moves + [(block, x, y, lines_cleared, rows, cols)]
-                    solve(temp_grid, remaining_blocks[1:], new_moves, current_score + lines_cleared) # Recursive call
-    # Initialize best score and move sequence
-    best_score = -1
-    best_move_sequence = None
-    min_remaining_units = float('inf')
-
-    for permutation in itertools.permutations(blocks): # Generate all permutations of blocks
-        solve(copy.deepcopy(grid), list(permutation), [], 0) # Start the recursive calls
-
-    if best_move_sequence is None: # Handle no valid moves
-        return 0, 0, []
-    return best_score, len(best_move_sequence), best_move_sequence
+    # Wrap the text so it fits within the space
+    max_text_width = SCREEN_WIDTH - BOARD_WIDTH * CELL_SIZE - 40
+    text_x = BOARD_WIDTH * CELL_SIZE + 20
+    text_y = 200 # Adjusted space for text
+    for line in wrap_text(text, TEXT_FONT, max_text_width):
+        screen.blit(TEXT_FONT.render(line, True, TEXT_COLOR), (text_x, text_y))
+        text_y += 40 # Adjust spacing between lines
+    return [TEXT_RECT, TRAY_RECT]
+
+def replay_moves(grid, moves):
+    "Work out the board after each move once, when a solution arrives"
+    snapshots = []
+    grid_copy = copy.deepcopy(grid)
+    for block, x, y, _, _, _ in moves:
+        place_block(grid_copy, block, x, y)
+        _, rows_cleared, cols_cleared = clear_lines(grid_copy)
+        snapshots.append((copy.deepcopy(grid_copy), rows_cleared, cols_cleared))
+    return snapshots
 
 def wrap_text(text, font, max_width):
     "Wrap text to fit within the max width"
@@ -238,117 +210,49 @@ def wrap_text(text, font, max_width):
 
     return lines
 
-def draw_next_button():
-    "Draw the Next button"
-    next_button_rect = pygame.Rect(GRID_SIZE * CELL_SIZE + 25, 50, 150, 50)
-    pygame.draw.rect(screen, (200, 200, 200), next_button_rect)
-    font = pygame.font.SysFont(None, 36)
-    if phase == "done":
-        text = font.render("Calculate", True, (0, 0, 0))
-        screen.blit(text, (GRID_SIZE * CELL_SIZE + 45, 63))
-    else:
-        text = font.render("Next", True, (0, 0, 0))
-        screen.blit(text, (GRID_SIZE * CELL_SIZE + 73, 63))
-
-    return next_button_rect
-
-def draw_again_button():
-    "Draw the Show Again button"
-    show_again_rect = pygame.Rect(GRID_SIZE * CELL_SIZE + 25, 125, 150, 50)
-
-    pygame.draw.rect(screen, (200, 200, 200), show_again_rect)
-
-    font = pygame.font.SysFont(None, 36)
-    show_again_text = font.render("Show Again", True, (0, 0, 0))
-
-    screen.blit(show_again_text, (GRID_SIZE * CELL_SIZE + 31, 138))
+def new_block_grids():
+    "Blank editor grids, one per block in a deal"
+    return [[[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)] for _ in range(PIECES)]
 
-    return show_again_rect
+def run_search(grid, blocks, progress):
+    "Run the solver on the background thread and keep its best plans"
+    global search_result
+    top = TopPlacements(TOP_PLANS)
+    find_best_placement(grid, blocks, progress, top=top)
+    search_result = top.results
 
-def draw_back_button():
-    "Draw the Back button"
-    back_button_rect = pygame.Rect(GRID_SIZE * CELL_SIZE + 25, 125, 150, 50) # Positioned below Next button
-    pygame.draw.rect(screen, (200, 200, 200), back_button_rect)
-    font = pygame.font.SysFont(None, 36)
-    text = font.render("Back", True, (0, 0, 0))
-    screen.blit(text, (GRID_SIZE * CELL_SIZE + 70, 138))
-    return back_button_rect
-
-def draw_reset_button():
-    "Draw the Reset button"
-    reset_button_rect = pygame.Rect(GRID_SIZE * CELL_SIZE + 25, 125, 150, 50) # Positioned below Next button
-    pygame.draw.rect(screen, (200, 200, 200), reset_button_rect)
-    font = pygame.font.SysFont(None, 36)
-    text = font.render("Reset", True, (0, 0, 0))
-    screen.blit(text, (GRID_SIZE * CELL_SIZE + 66, 138))
-    return reset_button_rect
+def start_search(grid, blocks):
+    "Start the solver on a background thread so the window keeps responding"
+    global search_progress, search_thread
+    search_progress = SearchProgress(SEARCH_TIME_BUDGET)
+    search_thread = threading.Thread(target=run_search, args=(copy.deepcopy(grid), copy.deepcopy(blocks), search_progress), daemon=True)
+    search_thread.start()
 
 # Main loop
 running = True
-block_grid_1 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-block_grid_2 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-block_grid_3 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
+block_grids = new_block_grids()
 num_blocks = 0
 block_index = 0
 phase = "map" # Start with map input phase
 user_input = '' # User input for number of blocks
-font = pygame.font.SysFont(None, 32)
+clock = pygame.time.Clock()
+screen.fill(BACKGROUND_COLOR)
+pygame.display.flip()
 
 while running:
-    screen.fill((0, 0, 0)) # Clear screen
-
-    # Draw buttons based on the phase
-    if phase == "create_block_1" or phase == "create_block_2" or phase == "create_block_3":
-        back_button_rect = draw_back_button()
-    if phase == "done" or phase == "cooked":
-        reset_button_rect = draw_reset_button()
-    
-    next_button_rect = draw_next_button() # Draw Next button
-
-    # Draw grids based on the current phase
-    if phase == "map":
-        draw_grid(screen, grid, GRID_SIZE, GRID_SIZE)
-    # Draw the three grids for the three blocks
-    elif phase == "create_block_1":
-        draw_grid(screen, block_grid_1, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)
-    elif phase == "create_block_2":
-        draw_grid(screen, block_grid_2, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)
-    elif phase == "create_block_3":
-        draw_grid(screen, block_grid_3, MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)
-
-    # Phase 5: Display moves
-    elif phase == "display_moves" and current_move_index == -1:
-        draw_grid(screen, grid, GRID_SIZE, GRID_SIZE)
-    elif phase == "display_moves" and current_move_index >= 0 and best_moves_sequence:
-        grid_copy = copy.deepcopy(grid)
-        highlight_rows = []
-        highlight_cols = []
-        total_score = 0
-
-        # Apply moves up to the current move
-        for i in range(current_move_index + 1):
-            block, x, y, move_score, rows_cleared, cols_cleared = best_moves_sequence[i]
-            place_block(grid_copy, block, x, y)
-            lines_cleared, rows_cleared, cols_cleared = clear_lines(grid_copy)
-            total_score += move_score
-            if i == current_move_index: # Only highlight the current move
-                highlight_rows = rows_cleared
-                highlight_cols = cols_cleared
-
-        # Draw the grid with highlights for the CURRENT move
-        draw_grid(screen, grid_copy, GRID_SIZE, GRID_SIZE, highlight_rows=highlight_rows, highlight_cols=highlight_cols)
-
-        # Draw the CURRENT block (red) on top of the grid
-        block, x, y, _, _, _ = best_moves_sequence[current_move_index]
-        for row_index, row in enumerate(block):
-            for col_index, cell in enumerate(row):
-                if cell == 1:
-                    rect = pygame.Rect((x + col_index) * CELL_SIZE, (y + row_index) * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-                    pygame.draw.rect(screen, CURRENT_BLOCK_COLOR, rect) # Draw the block here AFTER drawing the grid
-
-    else:
-        draw_grid(screen, grid, GRID_SIZE, GRID_SIZE)
-        draw_blocks(screen, blocks)
+    # Pick up the result once the background search finishes (or is stopped)
+    if phase == "searching" and not search_thread.is_alive():
+        plans = search_result
+        plan_index = 0
+        if plans and plans[0][2]: # Check if the sequence is empty
+            best_score, _, best_moves_sequence = plans[0]
+            move_snapshots = replay_moves(grid, best_moves_sequence) # Work out every board once instead of replaying each frame
+            current_move_index = 0 # Initialize for display
+            phase = "display_moves"
+        elif search_progress.cancelled or search_progress.timed_out: # Stopped before finding any moves, let the user try again
+            phase = "done"
+        else:
+            phase = "cooked"
 
     # Event handling
     for event in pygame.event.get():
@@ -360,150 +264,152 @@ while running:
             mouse_x, mouse_y = pygame.mouse.get_pos() # Get the mouse position
             
             # Handle Next button click
-            if next_button_rect.collidepoint(mouse_x, mouse_y):
+            if NEXT_BUTTON_RECT.collidepoint(mouse_x, mouse_y):
                 if phase == "map":
-                    phase = "create_block_1"
-                elif phase == "create_block_1":
-                    block_1 = remove_blank_lines(block_grid_1)
-                    if block_1: # Check if the block is valid
-                        blocks.append(block_1)
-                        block_index += 1
-                        phase = "create_block_2"
-                elif phase == "create_block_2":
-                    block_2 = remove_blank_lines(block_grid_2)
-                    if block_2: # Check if the block is valid
-                        blocks.append(block_2)
-                        block_index += 1
-                        phase = "create_block_3"
-                elif phase == "create_block_3":
-                    block_3 = remove_blank_lines(block_grid_3)
-                    if block_3: # Check if the blocks are valid
-                        blocks.append(block_3)
+                    phase = "create_block"
+                elif phase == "create_block":
+                    block = remove_blank_lines(block_grids[block_index])
+                    if block: # Check if the block is valid
+                        blocks.append(block)
                         block_index += 1
-                        phase = "done"
+                        if block_index == PIECES: # Every block of the deal is in
+                            phase = "done"
                 elif phase == "done":
                     if current_move_index == -1:
-                        best_score, best_moves, best_moves_sequence = find_best_placement(grid, blocks)
-                        if best_moves_sequence: # Check if the sequence is empty
-                            current_move_index = 0 # Initialize for display
-                            phase = "display_moves"
-                        else:
-                            phase = "cooked"
+                        start_search(grid, blocks)
+                        phase = "searching"
                 elif phase == "display_moves":
                     if current_move_index < len(best_moves_sequence) - 1:
                         current_move_index += 1
                     else:
-                        show_again_rect = draw_again_button() # Draw the Show Again button
-                        pygame.display.flip()
+                        pygame.display.update(draw_button("side", SIDE_BUTTON_RECT, "Show Again")) # Draw the Show Again button
                         waiting_for_choice = True # Wait for the user to click Show Again or Next button
                         while waiting_for_choice:
-                            for choice_event in pygame.event.get():
-                                if choice_event.type == pygame.MOUSEBUTTONDOWN:
-                                    choice_mouse_x, choice_mouse_y = pygame.mouse.get_pos()
-                                    # Handle Show Again button click
-                                    if show_again_rect.collidepoint(choice_mouse_x, choice_mouse_y):
-                                        current_move_index = 0
-                                        waiting_for_choice = False
-                                        break
-                                    # Handle Next button click
-                                    if next_button_rect.collidepoint(choice_mouse_x, choice_mouse_y):
-                                        grid = copy.deepcopy(grid_copy)
-                                        blocks = []
-                                        block_index = 0
-                                        block_grid_1 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-                                        block_grid_2 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-                                        block_grid_3 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-                                        phase = "create_block_1"
-                                        current_move_index = -1
-                                        waiting_for_choice = False
-                                        break
-                                elif choice_event.type == pygame.QUIT:
-                                    pygame.quit()
-                                    sys.exit()
+                            choice_event = pygame.event.wait() # Sleep until something happens
+                            if choice_event.type == pygame.MOUSEBUTTONDOWN:
+                                choice_mouse_x, choice_mouse_y = pygame.mouse.get_pos()
+                                # Handle Show Again button click
+                                if SIDE_BUTTON_RECT.collidepoint(choice_mouse_x, choice_mouse_y):
+                                    current_move_index = 0
+                                    waiting_for_choice = False
+                                # Handle Next button click
+                                elif NEXT_BUTTON_RECT.collidepoint(choice_mouse_x, choice_mouse_y):
+                                    grid = copy.deepcopy(move_snapshots[-1][0])
+                                    blocks = []
+                                    block_index = 0
+                                    block_grids = new_block_grids()
+                                    phase = "create_block"
+                                    current_move_index = -1
+                                    waiting_for_choice = False
+                            elif choice_event.type == pygame.QUIT:
+                                pygame.quit()
+                                sys.exit()
                         break
             
             # Handle Back button click
-            if phase == "create_block_1" or phase == "create_block_2" or phase == "create_block_3":
-                back_button_rect = draw_back_button()
-                if back_button_rect.collidepoint(mouse_x, mouse_y):
-                    if phase == "create_block_1" or phase == "create_block_2" or phase == "create_block_3":
-                        if block_index < 0:
-                            block_index = 0
-                        if phase == "create_block_1":
-                            phase = "map"
-                        elif phase == "create_block_2":
-                            blocks.pop() # Remove the last block
-                            block_grid_1 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)] # Reset the previous block grid
-                            block_index -= 1
-                            phase = "create_block_1"
-                        elif phase == "create_block_3":
-                            blocks.pop() # Remove the last block
-                            block_grid_2 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)] # Reset the previous block grid
-                            block_index -= 1
-                            phase = "create_block_2"
+            if phase == "create_block":
+                if SIDE_BUTTON_RECT.collidepoint(mouse_x, mouse_y):
+                    if block_index == 0:
+                        phase = "map"
+                    else:
+                        blocks.pop() # Remove the last block
+                        block_index -= 1
+                        block_grids[block_index] = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)] # Reset the previous block grid
+
+            # Handle Other Plan button click
+            if phase == "display_moves" and len(plans) > 1:
+                if SIDE_BUTTON_RECT.collidepoint(mouse_x, mouse_y):
+                    plan_index = (plan_index + 1) % len(plans) # Step through the alternatives, wrapping back to the best
+                    best_score, _, best_moves_sequence = plans[plan_index]
+                    move_snapshots = replay_moves(grid, best_moves_sequence)
+                    current_move_index = 0
+
+            # Handle Cancel button click
+            if phase == "searching":
+                if SIDE_BUTTON_RECT.collidepoint(mouse_x, mouse_y):
+                    search_progress.cancel() # The search stops and hands back the best moves found so far
 
             # Handle Reset button click
             if phase == "done" or phase == "cooked":
-                reset_button_rect = draw_reset_button()
-                if reset_button_rect.collidepoint(mouse_x, mouse_y):
+                if SIDE_BUTTON_RECT.collidepoint(mouse_x, mouse_y):
                     phase = "map"
                     blocks = []
                     block_index = 0
                     current_move_index = -1
-                    grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
-                    block_grid_1 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-                    block_grid_2 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
-                    block_grid_3 = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
+                    grid = [[0 for _ in range(BOARD_WIDTH)] for _ in range(BOARD_HEIGHT)]
+                    block_grids = new_block_grids()
                     user_input = ''
 
             # Phase 1: Input the map (toggle cells on the grid)
             if phase == "map":
-                if mouse_x < GRID_SIZE * CELL_SIZE and mouse_y < GRID_SIZE * CELL_SIZE: # Ensure the click is within the grid bounds
+                if mouse_x < BOARD_WIDTH * CELL_SIZE and mouse_y < BOARD_HEIGHT * CELL_SIZE: # Ensure the click is within the grid bounds
                     grid_x, grid_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
                     grid[grid_y][grid_x] = 1 - grid[grid_y][grid_x] # Toggle state of the cell
 
-            # Phase 2: Create block 1
-            elif phase == "create_block_1":
+            # Phase 2: Create each block of the deal in turn
+            elif phase == "create_block":
                 if mouse_x < MAX_BLOCK_SIZE * CELL_SIZE and mouse_y < MAX_BLOCK_SIZE * CELL_SIZE: # Ensure the click is within the grid bounds
-                    block_grid_1_x, block_grid_1_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
-                    block_grid_1[block_grid_1_y][block_grid_1_x] = 1 - block_grid_1[block_grid_1_y][block_grid_1_x] # Toggle state of the cell
+                    block_grid = block_grids[block_index]
+                    block_grid_x, block_grid_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
+                    block_grid[block_grid_y][block_grid_x] = 1 - block_grid[block_grid_y][block_grid_x] # Toggle state of the cell
 
-            # Phase 3: Create block 2
-            elif phase == "create_block_2":
-                if mouse_x < MAX_BLOCK_SIZE * CELL_SIZE and mouse_y < MAX_BLOCK_SIZE * CELL_SIZE: # Ensure the click is within the grid bounds
-                    block_grid_2_x, block_grid_2_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
-                    block_grid_2[block_grid_2_y][block_grid_2_x] = 1 - block_grid_2[block_grid_2_y][block_grid_2_x] # Toggle state of the cell
-            
-            # Phase 4: Create block 3
-            elif phase == "create_block_3":
-                if mouse_x < MAX_BLOCK_SIZE * CELL_SIZE and mouse_y < MAX_BLOCK_SIZE * CELL_SIZE: # Ensure the click is within the grid bounds
-                    block_grid_3_x, block_grid_3_y = mouse_x // CELL_SIZE, mouse_y // CELL_SIZE
-                    block_grid_3[block_grid_3_y][block_grid_3_x] = 1 - block_grid_3[block_grid_3_y][block_grid_3_x] # Toggle state of the cell
+    # Work out what the grid shows based on the current phase
+    tray_blocks = []
+    if phase == "map":
+        cell_sprites = grid_sprites(grid, BOARD_WIDTH, BOARD_HEIGHT)
+    # Draw the grid of the block being created
+    elif phase == "create_block":
+        cell_sprites = grid_sprites(block_grids[block_index], MAX_BLOCK_SIZE, MAX_BLOCK_SIZE)
+
+    # Phase 3: Display moves
+    elif phase == "display_moves" and current_move_index >= 0 and move_snapshots:
+        # Show the board after the CURRENT move with its cleared lines highlighted, and the CURRENT block (red) on top
+        grid_copy, highlight_rows, highlight_cols = move_snapshots[current_move_index]
+        block, x, y, _, _, _ = best_moves_sequence[current_move_index]
+        current_cells = {(x + col_index, y + row_index) for row_index, row in enumerate(block) for col_index, cell in enumerate(row) if cell == 1}
+        cell_sprites = grid_sprites(grid_copy, BOARD_WIDTH, BOARD_HEIGHT, highlight_rows, highlight_cols, current_cells)
 
-    font = pygame.font.SysFont(None, 32)
+    else:
+        cell_sprites = grid_sprites(grid, BOARD_WIDTH, BOARD_HEIGHT)
+        if phase != "display_moves":
+            tray_blocks = blocks
 
     # Define the message based on the current phase
     if phase == "map":
         text = "Click to toggle map units, then click next to continue."
-    elif phase == "create_block_1" or phase == "create_block_2" or phase == "create_block_3":
-        text = f"Create block {block_index + 1}. Click to toggle cells."
+    elif phase == "create_block":
+        text = f"Create block {block_index + 1} of {PIECES}. Click to toggle cells."
     elif phase == "done":
         text = "Ready to calculate."
+    elif phase == "searching":
+        best_so_far = search_progress.best[0] if search_progress.best else "none yet"
+        text = f"Searching... {search_progress.nodes} positions, best score {best_so_far}. Click cancel to use the best so far."
     elif phase == "display_moves":
         text = f"Displaying move {current_move_index + 1}. Click next to see the next move."
+        if len(plans) > 1:
+            text = f"Plan {plan_index + 1} of {len(plans)}, score {best_score}. " + text
+        if search_progress.cancelled or search_progress.timed_out: # The plans may not be the best ones
+            text = "Search cut off, showing the best found so far. " + text
     elif phase == "cooked":
         text = "You're cooked."
 
-    # Wrap the text so it fits within the space
-    max_text_width = SCREEN_WIDTH - GRID_SIZE * CELL_SIZE - 40
-    wrapped_text = wrap_text(text, font, max_text_width)
-
-    # Display the wrapped text with padding from the bottom
-    text_x = GRID_SIZE * CELL_SIZE + 20
-    text_y = 200 # Adjusted space for text
-    for line in wrapped_text:
-        screen.blit(font.render(line, True, (255, 255, 255)), (text_x, text_y))
-        text_y += 40 # Adjust spacing between lines
-
-    # Update display
-    pygame.display.flip()
\ No newline at end of file
+    # Buttons based on the phase
+    side_button = None
+    if phase == "create_block":
+        side_button = "Back"
+    elif phase == "done" or phase == "cooked":
+        side_button = "Reset"
+    elif phase == "searching":
+        side_button = "Cancel"
+    elif phase == "display_moves" and len(plans) > 1:
+        side_button = "Other Plan"
+    next_button = "Calculate" if phase == "done" or phase == "searching" else "Next"
+
+    # Redraw only what changed since the last frame
+    dirty_rects = draw_cells(cell_sprites)
+    dirty_rects += draw_button("next", NEXT_BUTTON_RECT, next_button)
+    dirty_rects += draw_button("side", SIDE_BUTTON_RECT, side_button)
+    dirty_rects += draw_info(text, tray_blocks)
+    if dirty_rects:
+        pygame.display.update(dirty_rects)
+    clock.tick(FPS) # Sleep out the rest of the frame
\ No newline at end of file
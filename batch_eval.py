@@ -0,0 +1,46 @@
+# Block Blast Calc batch evaluator by Kozurito
+# Evaluates one block on many boards at once with NumPy, using the same rules as solver.clear_lines
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from solver import GRID_SIZE
+
+def boards_from_bitboards(bitboards):
+    "Turn a sequence of bitboards into an (N, GRID_SIZE, GRID_SIZE) uint8 array"
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    bits = (bitboards[:, None] >> np.arange(GRID_SIZE * GRID_SIZE, dtype=np.uint64)) & np.uint64(1)
+    return bits.astype(np.uint8).reshape(-1, GRID_SIZE, GRID_SIZE)
+
+def placement_masks(block):
+    "Every in-bounds placement of a block as a (rows, cols, GRID_SIZE, GRID_SIZE) array, indexed [y, x] by its top left corner"
+    piece = np.asarray(block, dtype=np.uint8)
+    height, width = piece.shape
+    masks = np.zeros((GRID_SIZE - height + 1, GRID_SIZE - width + 1, GRID_SIZE, GRID_SIZE), dtype=np.uint8)
+    for y in range(GRID_SIZE - height + 1):
+        for x in range(GRID_SIZE - width + 1):
+            masks[y, x, y:y + height, x:x + width] = piece
+    return masks
+
+def legal_placements(boards, block):
+    "Legality of every placement of a block on every board, as an (N, rows, cols) bool array indexed [n, y, x]"
+    boards = np.asarray(boards, dtype=np.uint8)
+    piece = np.asarray(block, dtype=np.uint8)
+    windows = sliding_window_view(boards, piece.shape, axis=(1, 2)) # (N, rows, cols, height, width) views, no copies
+    return ~np.any(windows & piece, axis=(3, 4))
+
+def evaluate_placements(boards, block):
+    "Place a block at every offset on every board and clear full lines, returns (legal, result boards, lines cleared) indexed [n, y, x]"
+    # Memory grows with N * offsets * GRID_SIZE^2, so split very large batches into chunks
+    boards = np.asarray(boards, dtype=np.uint8)
+    legal = legal_placements(boards, block)
+
+    placed = boards[:, None, None] | placement_masks(block)[None] # (N, rows, cols, GRID_SIZE, GRID_SIZE)
+    full_rows = placed.all(axis=4)
+    full_cols = placed.all(axis=3)
+    cleared = full_rows[..., :, None] | full_cols[..., None, :]
+    result_boards = np.where(cleared, 0, placed).astype(np.uint8)
+    lines_cleared = full_rows.sum(axis=3) + full_cols.sum(axis=3)
+
+    # Illegal offsets keep the input board and clear no lines
+    result_boards = np.where(legal[..., None, None], result_boards, boards[:, None, None])
+    lines_cleared = np.where(legal, lines_cleared, 0).astype(np.uint8)
+    return legal, result_boards, lines_cleared
@@ -0,0 +1,129 @@
+# Block Blast Calc batch solver by Kozurito
+# Reads puzzles as JSON lines and writes solutions as JSON lines, no display needed
+#
+# Input line:  {"id": "optional", "grid": [[0, 1, ...], ...], "blocks": [[[1, 1], [1, 0]], ...]}
+# Output line: {"id": "optional", "score": 2, "moves": 3, "sequence": [{"block": ..., "x": 0, "y": 0, "lines_cleared": 1, "rows": [0], "cols": []}, ...]}
+import argparse
+import functools
+import json
+import sys
+import lookahead
+import solver
+from opening_book import OpeningBook
+from parallel_solver import ParallelSolver
+from solution_cache import SolutionCache
+from solver import MAX_BLOCK_SIZE, remove_blank_lines
+
+def parse_grid(grid):
+    "Check the map is a rectangle of 0s and 1s, any board size works"
+    if not grid or not grid[0] or any(len(row) != len(grid[0]) for row in grid):
+        raise ValueError("grid must be a non-empty rectangle")
+    if any(cell not in (0, 1) for row in grid for cell in row):
+        raise ValueError("grid cells must be 0 or 1")
+    return [list(row) for row in grid]
+
+def parse_block(block):
+    "Pad a block to MAX_BLOCK_SIZE x MAX_BLOCK_SIZE and trim it the same way the block editor does"
+    if len(block) > MAX_BLOCK_SIZE or any(len(row) > MAX_BLOCK_SIZE for row in block):
+        raise ValueError(f"blocks can be at most {MAX_BLOCK_SIZE}x{MAX_BLOCK_SIZE}")
+    if any(cell not in (0, 1) for row in block for cell in row):
+        raise ValueError("block cells must be 0 or 1")
+    padded = [[0 for _ in range(MAX_BLOCK_SIZE)] for _ in range(MAX_BLOCK_SIZE)]
+    for y, row in enumerate(block):
+        for x, cell in enumerate(row):
+            padded[y][x] = cell
+    trimmed = remove_blank_lines(padded)
+    if not trimmed:
+        raise ValueError("blocks can't be empty")
+    return trimmed
+
+def format_solution(best_score, best_moves, best_moves_sequence):
+    "Build the output record for a find_best_placement result"
+    return {
+        "score": best_score,
+        "moves": best_moves,
+        "sequence": [
+            {"block": block, "x": x, "y": y, "lines_cleared": lines_cleared, "rows": rows, "cols": cols}
+            for block, x, y, lines_cleared, rows, cols in best_moves_sequence
+        ],
+    }
+
+def solve_puzzle(puzzle, find_best_placement=solver.find_best_placement, with_stats=False):
+    "Solve one decoded puzzle and build its output record"
+    grid = parse_grid(puzzle["grid"])
+    blocks = [parse_block(block) for block in puzzle["blocks"]]
+    stats = solver.SearchStats() if with_stats else None
+    if stats is not None:
+        best_score, best_moves, best_moves_sequence = solver.find_best_placement(grid, blocks, stats=stats)
+    else:
+        best_score, best_moves, best_moves_sequence = find_best_placement(grid, blocks)
+    record = format_solution(best_score, best_moves, best_moves_sequence)
+    if stats is not None:
+        record["stats"] = stats.to_dict()
+    return record
+
+def solve_stream(lines, output, find_best_placement=solver.find_best_placement, with_stats=False):
+    "Solve every puzzle in a stream of JSON lines, writing one result line per puzzle"
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip(): # Skip blank lines
+            continue
+        record = {}
+        try:
+            puzzle = json.loads(line)
+            if "id" in puzzle:
+                record["id"] = puzzle["id"]
+            record.update(solve_puzzle(puzzle, find_best_placement, with_stats))
+        except (ValueError, KeyError, TypeError) as error: # Report bad puzzles without stopping the batch
+            record["error"] = f"line {line_number}: {error}"
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Solve Block Blast puzzles given as JSON lines.")
+    parser.add_argument("input", nargs="?", default="-", help="JSON lines file to read, or - for stdin (default)")
+    parser.add_argument("-o", "--output", default="-", help="file to write results to, or - for stdout (default)")
+    parser.add_argument("-c", "--cache", help="SQLite file to cache solutions in, shared between runs")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes to split each search across (default 1, 0 for one per CPU)")
+    parser.add_argument("-s", "--stats", action="store_true", help="add search counters to every result (solves serially without the cache)")
+    parser.add_argument("-b", "--book", help="opening book to answer covered positions from, see opening_book.py")
+    parser.add_argument("-l", "--lookahead", type=int, metavar="TURNS", help="pick between the best sequences by sampling this many future deals")
+    parser.add_argument("--samples", type=int, default=lookahead.SAMPLES, help=f"sampled deal sequences per candidate with --lookahead (default {lookahead.SAMPLES})")
+    parser.add_argument("--time-budget", type=float, help="seconds per puzzle for --lookahead, the candidates sampled so far decide when it runs out (default no limit)")
+    args = parser.parse_args(argv)
+    if args.stats and (args.cache or args.workers != 1):
+        parser.error("--stats can't be combined with --cache or --workers")
+    if args.stats and args.book:
+        parser.error("--stats can't be combined with --book")
+    if args.lookahead and (args.stats or args.cache or args.book or args.workers != 1):
+        parser.error("--lookahead can't be combined with --stats, --cache, --book or --workers")
+    if args.time_budget is not None and not args.lookahead:
+        parser.error("--time-budget only applies with --lookahead")
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    parallel_solver = ParallelSolver(args.workers or None) if args.workers != 1 else None
+    find_best_placement = parallel_solver.find_best_placement if parallel_solver else solver.find_best_placement
+    if args.lookahead:
+        find_best_placement = functools.partial(lookahead.find_best_placement, turns=args.lookahead, samples=args.samples, time_budget=args.time_budget)
+    book = OpeningBook(args.book, solve=find_best_placement) if args.book else None
+    if book:
+        find_best_placement = book.find_best_placement
+    cache = SolutionCache(args.cache, solve=find_best_placement) if args.cache else None
+    try:
+        solve_stream(input_file, output_file, cache.find_best_placement if cache else find_best_placement, args.stats)
+    finally:
+        if cache:
+            print(json.dumps(cache.stats()), file=sys.stderr) # Hit/miss counters for the run
+            cache.close()
+        if book:
+            print(json.dumps(book.stats()), file=sys.stderr)
+        if parallel_solver:
+            parallel_solver.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+
+if __name__ == "__main__":
+    main()
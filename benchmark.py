@@ -0,0 +1,190 @@
+# Block Blast Calc benchmark by Kozurito
+# Runs the solver over a fixed corpus of positions, checks every answer against the stored reference,
+# and records nodes, wall time and peak memory. Compare two runs to catch regressions.
+# Positions marked "reference": "solver" are too big for the exhaustive search, their stored answers come from the
+# solver itself, so they are timed but not checked
+#
+#   python benchmark.py -o before.json
+#   python benchmark.py -o after.json --compare before.json
+import argparse
+import copy
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import bitboard
+import solver
+from solver import SearchProgress, place_block, clear_lines
+
+CORPUS_PATH = "benchmark_corpus.jsonl"
+REGRESSION_THRESHOLD = 0.2 # Flag anything more than 20% slower
+MIN_COMPARE_SECONDS = 0.005 # Positions faster than this are too noisy to flag on their own
+UNVERIFIED_REFERENCE = "solver" # The "reference" of positions whose answers the exhaustive search couldn't check
+
+def load_corpus(path):
+    "Read the corpus, one position per line"
+    with open(path) as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+def remaining_units(grid, moves):
+    "Replay a move sequence and count the filled cells left"
+    grid = copy.deepcopy(grid)
+    for block, x, y, _, _, _ in moves:
+        place_block(grid, block, x, y)
+        clear_lines(grid)
+    return sum(sum(row) for row in grid)
+
+def exhaustive_search(grid, blocks):
+    "Reference answer, every order and placement to full depth with no pruning, returns (score, remaining units)"
+    # Only memoized on the board and the blocks left, which can't change the answer and keeps the 10x10 positions feasible
+    layout = bitboard.grid_layout(grid)
+    placements = [bitboard.block_placements(block, layout) for block in blocks]
+    memo = {} # (board, indices of the blocks left) -> best (score, remaining units) from there, score -1 if they can't all be placed
+
+    def solve(board, remaining):
+        if not remaining:
+            return 0, bitboard.count_units(board)
+        key = (board, remaining)
+        if key not in memo:
+            best = (-1, float('inf'))
+            for index in remaining:
+                for _, _, mask in placements[index]:
+                    if board & mask == 0:
+                        new_board, rows, cols = bitboard.clear_lines(board | mask, layout)
+                        score, units = solve(new_board, remaining - {index})
+                        if score < 0: # The other blocks don't fit after this
+                            continue
+                        score += len(rows) + len(cols)
+                        if score > best[0] or (score == best[0] and units < best[1]):
+                            best = (score, units)
+            memo[key] = best
+        return memo[key]
+
+    best = solve(bitboard.grid_to_board(grid), frozenset(range(len(blocks))))
+    return (0, 0) if best[0] < 0 else best
+
+def is_unverified(position):
+    "Check if a position's stored answer didn't come from the exhaustive search"
+    return position.get("reference") == UNVERIFIED_REFERENCE
+
+def run_position(position, repeat):
+    "Solve one position, returns its record"
+    seconds = float('inf')
+    for _ in range(repeat): # Keep the fastest run to cut noise
+        progress = SearchProgress()
+        start = time.perf_counter()
+        best_score, _, best_moves_sequence = solver.find_best_placement(position["grid"], position["blocks"], progress)
+        seconds = min(seconds, time.perf_counter() - start)
+
+    tracemalloc.start() # Separate run, tracing slows the solver down
+    solver.find_best_placement(position["grid"], position["blocks"])
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    units = remaining_units(position["grid"], best_moves_sequence) if best_moves_sequence else 0 # No moves counts as 0, like find_best_placement
+    return {
+        "name": position["name"],
+        "tier": position["tier"],
+        "nodes": progress.nodes,
+        "seconds": seconds,
+        "nodes_per_second": progress.nodes / seconds if seconds else 0.0,
+        "peak_kib": peak_bytes / 1024,
+        "score": best_score,
+        "remaining_units": units,
+        "correct": None if is_unverified(position) else [best_score, units] == [position["score"], position["remaining_units"]], # None when there is no checked answer
+    }
+
+def summarize(records):
+    "Totals overall and per tier"
+    def totals(group):
+        seconds = sum(record["seconds"] for record in group)
+        return {
+            "positions": len(group),
+            "nodes": sum(record["nodes"] for record in group),
+            "seconds": seconds,
+            "positions_per_second": len(group) / seconds if seconds else 0.0,
+            "peak_kib": max(record["peak_kib"] for record in group),
+            "incorrect": [record["name"] for record in group if record["correct"] is False],
+            "unverified": [record["name"] for record in group if record["correct"] is None],
+        }
+    tiers = {}
+    for record in records:
+        tiers.setdefault(record["tier"], []).append(record)
+    return {"total": totals(records), "tiers": {tier: totals(group) for tier, group in tiers.items()}}
+
+def compare(before, after, threshold):
+    "List the regressions between two benchmark results"
+    regressions = []
+    def check(name, old_seconds, new_seconds):
+        if new_seconds > old_seconds * (1 + threshold):
+            regressions.append(f"{name}: {old_seconds * 1000:.1f}ms -> {new_seconds * 1000:.1f}ms ({new_seconds / old_seconds - 1:+.0%})")
+
+    if [record["name"] for record in before["positions"]] == [record["name"] for record in after["positions"]]: # Totals only line up on the same positions
+        check("total", before["summary"]["total"]["seconds"], after["summary"]["total"]["seconds"])
+    for tier, totals in after["summary"]["tiers"].items():
+        if tier in before["summary"]["tiers"]:
+            check(f"tier {tier}", before["summary"]["tiers"][tier]["seconds"], totals["seconds"])
+    old_records = {record["name"]: record for record in before["positions"]}
+    for record in after["positions"]:
+        old = old_records.get(record["name"])
+        if old and max(old["seconds"], record["seconds"]) >= MIN_COMPARE_SECONDS:
+            check(record["name"], old["seconds"], record["seconds"])
+        if old and record["nodes"] > old["nodes"] * (1 + threshold): # Node counts don't depend on machine load
+            regressions.append(f"{record['name']}: {old['nodes']} -> {record['nodes']} nodes")
+    return regressions
+
+def regenerate(path, tiers=None):
+    "Recompute the reference answers in the corpus with the exhaustive search, only for the given tiers if any, unverified positions are kept as they are"
+    corpus = load_corpus(path)
+    with open(path, "w") as corpus_file:
+        for position in corpus:
+            if is_unverified(position):
+                print(f"{position['name']}: skipped, too big for the exhaustive search", file=sys.stderr)
+            elif not tiers or position["tier"] in tiers:
+                position["score"], position["remaining_units"] = exhaustive_search(position["grid"], position["blocks"])
+                print(f"{position['name']}: score {position['score']}, {position['remaining_units']} units left", file=sys.stderr)
+            corpus_file.write(json.dumps(position) + "\n")
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Benchmark the solver on a fixed corpus of positions.")
+    parser.add_argument("--corpus", default=CORPUS_PATH, help=f"corpus to run (default {CORPUS_PATH})")
+    parser.add_argument("-o", "--output", default="-", help="file to write the JSON results to, or - for stdout (default)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timed runs per position, the fastest counts (default 3)")
+    parser.add_argument("--tier", action="append", help="only run or regenerate these tiers (repeatable)")
+    parser.add_argument("--compare", help="earlier results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help=f"slowdown that counts as a regression (default {REGRESSION_THRESHOLD})")
+    parser.add_argument("--regenerate", action="store_true", help="recompute the corpus reference answers with the exhaustive search (slow)")
+    args = parser.parse_args(argv)
+
+    if args.regenerate:
+        regenerate(args.corpus, args.tier)
+        return 0
+
+    corpus = [position for position in load_corpus(args.corpus) if not args.tier or position["tier"] in args.tier]
+    records = []
+    for position in corpus:
+        record = run_position(position, args.repeat)
+        records.append(record)
+        print(f"{record['name']}: {record['nodes']} nodes, {record['seconds'] * 1000:.1f}ms, {record['peak_kib']:.0f}KiB{', WRONG ANSWER' if record['correct'] is False else ', unverified' if record['correct'] is None else ''}", file=sys.stderr)
+
+    results = {"python": platform.python_version(), "positions": records, "summary": summarize(records)}
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    failed = bool(results["summary"]["total"]["incorrect"])
+    if args.compare:
+        with open(args.compare) as before_file:
+            regressions = compare(json.load(before_file), results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# Bitboard core for Block Blast Calc
+# The board is a single integer where cell (x, y) is bit y * width + x, any board size fits in a Python int
+import functools
+
+GRID_SIZE = 8 # Default board size, other sizes get their own BoardLayout
+
+class BoardLayout:
+    "Precomputed line masks and shifts for a width x height board, where cell (x, y) is bit y * width + x"
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.full_board = (1 << (width * height)) - 1
+        # One mask per row and one per column
+        self.row_masks = [((1 << width) - 1) << (y * width) for y in range(height)]
+        self.col_masks = [sum(1 << (y * width + x) for y in range(height)) for x in range(width)]
+        self.row_span_shifts = _span_shifts(width, 1)
+        self.col_span_shifts = _span_shifts(height, width)
+
+    def __reduce__(self):
+        return board_layout, (self.width, self.height) # Unpickle to the shared layout, so worker processes keep the catalog fast path
+
+def _span_shifts(length, step):
+    "Shifts that AND each cell with the next length - 1 cells step bits apart"
+    shifts = []
+    span = 1
+    while span < length:
+        shift = min(span, length - span)
+        shifts.append(shift * step)
+        span += shift
+    return shifts
+
+@functools.lru_cache(maxsize=None)
+def board_layout(width, height=None):
+    "Shared layout for a board size, square if only the width is given"
+    return BoardLayout(width, width if height is None else height)
+
+def grid_layout(grid):
+    "Layout matching a list-of-lists grid"
+    return board_layout(len(grid[0]), len(grid))
+
+DEFAULT_LAYOUT = board_layout(GRID_SIZE)
+FULL_BOARD = DEFAULT_LAYOUT.full_board
+ROW_MASKS = DEFAULT_LAYOUT.row_masks
+COL_MASKS = DEFAULT_LAYOUT.col_masks
+ROW_SPAN_SHIFTS = DEFAULT_LAYOUT.row_span_shifts
+COL_SPAN_SHIFTS = DEFAULT_LAYOUT.col_span_shifts
+
+def grid_to_board(grid):
+    "Convert a list-of-lists grid into a bitboard"
+    board = 0
+    for y, row in enumerate(grid):
+        for x, cell in enumerate(row):
+            if cell == 1:
+                board |= 1 << (y * len(row) + x)
+    return board
+
+def board_to_grid(board, layout=DEFAULT_LAYOUT):
+    "Convert a bitboard back into a list-of-lists grid"
+    width = layout.width
+    return [[(board >> (y * width + x)) & 1 for x in range(width)] for y in range(layout.height)]
+
+def block_mask(block, x=0, y=0, layout=DEFAULT_LAYOUT):
+    "Build the mask of a block placed with its top left corner at (x, y)"
+    mask = 0
+    for row_index, row in enumerate(block):
+        for col_index, cell in enumerate(row):
+            if cell == 1:
+                mask |= 1 << ((y + row_index) * layout.width + x + col_index)
+    return mask
+
+def block_placements(block, layout=DEFAULT_LAYOUT):
+    "List every in-bounds (x, y, mask) for a block, in the same order the solver scans positions"
+    base = block_mask(block, layout=layout)
+    placements = []
+    for y in range(layout.height - len(block) + 1):
+        for x in range(layout.width - len(block[0]) + 1):
+            placements.append((x, y, base << (y * layout.width + x)))
+    return placements
+
+def fit_table(block, placements, layout=DEFAULT_LAYOUT):
+    "Bit offsets of a block's cells from its top left corner, and the mask of top left corners that keep it in bounds"
+    offsets = []
+    mask = block_mask(block, layout=layout)
+    while mask:
+        low = mask & -mask
+        offsets.append(low.bit_length() - 1)
+        mask ^= low
+    anchors = 0
+    for x, y, _ in placements:
+        anchors |= 1 << (y * layout.width + x)
+    return tuple(offsets), anchors
+
+def fitting_anchors(empty, fit):
+    "Top left corners where a block fits on the empty cells, one shift per block cell instead of one test per placement"
+    offsets, anchors = fit
+    for offset in offsets:
+        anchors &= empty >> offset
+    return anchors
+
+def covered_cells(anchors, fit):
+    "Every cell a block covers when placed at any of the given top left corners"
+    offsets, _ = fit
+    covered = 0
+    for offset in offsets:
+        covered |= anchors << offset
+    return covered
+
+def has_full_line(board, layout=DEFAULT_LAYOUT):
+    "Check if any row or column is full"
+    rows = cols = board
+    for shift in layout.row_span_shifts:
+        rows &= rows >> shift
+    for shift in layout.col_span_shifts:
+        cols &= cols >> shift
+    return bool(rows & layout.col_masks[0] or cols & layout.row_masks[0]) # A set bit in the first column or row marks the start of a full line
+
+def clear_lines(board, layout=DEFAULT_LAYOUT):
+    "Clear full rows and columns, returns the new board and the cleared rows and columns"
+    if not has_full_line(board, layout): # Nothing to clear
+        return board, [], []
+    row_masks = layout.row_masks
+    col_masks = layout.col_masks
+    rows = [y for y in range(layout.height) if board & row_masks[y] == row_masks[y]]
+    cols = [x for x in range(layout.width) if board & col_masks[x] == col_masks[x]]
+    for y in rows:
+        board &= ~row_masks[y]
+    for x in cols:
+        board &= ~col_masks[x]
+    return board, rows, cols
+
+def full_lines(board, layout=DEFAULT_LAYOUT):
+    "Find the full rows and columns without building lists, returns (mask of their cells, number of lines)"
+    rows = cols = board
+    for shift in layout.row_span_shifts:
+        rows &= rows >> shift
+    for shift in layout.col_span_shifts:
+        cols &= cols >> shift
+    rows &= layout.col_masks[0] # One bit at the start of each full row
+    cols &= layout.row_masks[0] # One bit at the top of each full column
+    if not rows | cols:
+        return 0, 0
+    return rows * layout.row_masks[0] | cols * layout.col_masks[0], bin(rows).count("1") + bin(cols).count("1") # Multiplying spreads each start bit along its line
+
+if hasattr(int, "bit_count"): # Python 3.10+ counts bits without building a string
+    count_units = int.bit_count
+else:
+    def count_units(board):
+        "Count the filled cells on a board"
+        return bin(board).count("1")
+
+def fillable_lines(board, cells, layout=DEFAULT_LAYOUT, coverable=None):
+    "Mask of every line that placing the given number of cells on the coverable cells (default every empty cell) could fill"
+    empty = layout.full_board & ~board
+    uncoverable = 0 if coverable is None else empty & ~coverable
+    lines = 0
+    for mask in layout.row_masks + layout.col_masks:
+        if not uncoverable & mask and count_units(empty & mask) <= cells:
+            lines |= mask
+    return lines
+
+def reachable_lines(board, reach, layout=DEFAULT_LAYOUT):
+    "Mask of every line that blocks able to put reach[0] cells in a row and reach[1] in a column could fill"
+    row_reach, col_reach = reach
+    lines = 0
+    for mask in layout.row_masks:
+        if layout.width - count_units(board & mask) <= row_reach:
+            lines |= mask
+    for mask in layout.col_masks:
+        if layout.height - count_units(board & mask) <= col_reach:
+            lines |= mask
+    return lines
+
+@functools.lru_cache(maxsize=None)
+def _refills_within_reach(cells, width, height, rows_refill=True, cols_refill=True):
+    "Count how many times lines that were already cleared could be filled again with the given cells, a row takes width cells and a column height, less one cell per row and column filled together"
+    lines = 0
+    while any(
+        max(rows * width + (lines + 1 - rows) * (height - rows), rows * width, (lines + 1 - rows) * height) <= cells
+        for rows in range(lines + 2) if (rows_refill or rows == 0) and (cols_refill or rows == lines + 1)
+    ):
+        lines += 1
+    return lines
+
+@functools.lru_cache(maxsize=None)
+def _refill_table(cells, width, height, rows_refill=True, cols_refill=True):
+    "_refills_within_reach for every number of cells from 0 to cells, so a bound looks them up instead of calling it per pair of line counts"
+    return [_refills_within_reach(spare, width, height, rows_refill, cols_refill) for spare in range(cells + 1)]
+
+def _cheapest_lines(empty, masks, reach, cells):
+    "Cells it takes to fill the cheapest 0, 1, 2... of the given lines of the empty cells, while each line is within reach and the total within cells, and the mask of the cheapest lines"
+    line_empty = [count_units(empty & mask) for mask in masks]
+    costs = [0]
+    total = 0
+    for empty_cells in sorted(line_empty):
+        total += empty_cells
+        if empty_cells > reach or total > cells:
+            break
+        costs.append(total)
+    cheapest = 0
+    if len(costs) > 1:
+        for mask, empty_cells in zip(masks, line_empty):
+            if empty_cells == costs[1]:
+                cheapest |= mask
+    return costs, cheapest
+
+def max_lines_cleared(board, cells, layout=DEFAULT_LAYOUT, capacity=None):
+    "Upper bound on the lines that placing the given number of cells can still clear, capacity[r][c] is the most cells the blocks can put into any r rows and c columns together"
+    # Clearing r rows and c columns takes at least their empty cells, and a row and a column share at most one of them.
+    # Taking the lines with the fewest empty cells gives the cheapest r rows and c columns. A single row and column
+    # only save that cell if one of the cheapest rows crosses one of the cheapest columns on an empty cell
+    row_reach, col_reach = (capacity[1][0], capacity[0][1]) if capacity is not None else (layout.width, layout.height)
+    empty = layout.full_board & ~board
+    row_costs, cheapest_rows = _cheapest_lines(empty, layout.row_masks, row_reach, cells)
+    col_costs, cheapest_cols = _cheapest_lines(empty, layout.col_masks, col_reach, cells)
+    crossing = 1 if empty & cheapest_rows & cheapest_cols else 0
+    refills = _refill_table(cells, layout.width, layout.height, row_reach >= layout.width, col_reach >= layout.height) # A cleared line has to be filled from scratch again
+    best = 0
+    for rows in range(len(row_costs) - 1, -1, -1): # Most lines first, so on a crowded board the first pair that fits usually settles it
+        row_cells = row_costs[rows]
+        row_capacity = capacity[rows] if capacity is not None else None
+        most_refills = refills[cells - row_cells]
+        for cols in range(len(col_costs) - 1, -1, -1): # Fewer columns only win through refills
+            if rows + cols + most_refills <= best:
+                break
+            col_cells = col_costs[cols]
+            needed = max(row_cells + col_cells - (crossing if rows * cols == 1 else rows * cols), row_cells, col_cells)
+            if needed > cells or row_capacity is not None and needed > row_capacity[cols]: # The blocks can't put that many cells into so few lines
+                continue
+            best = max(best, rows + cols + refills[cells - needed])
+    return best
@@ -0,0 +1,160 @@
+# Block Blast Calc board features by Kozurito
+# Survivability features of a bitboard, kept up to date as the search moves between boards instead of being
+# recomputed at every leaf. Pass a BoardFeatures to solver.find_best_placement as its evaluator
+import bitboard
+from bitboard import GRID_SIZE, FULL_BOARD, COL_MASKS, fitting_anchors
+
+# Blocks checked for "still fits somewhere", the large ones a crowded board runs out of room for first
+FIT_PIECES = [
+    [[1, 1, 1, 1, 1]], [[1], [1], [1], [1], [1]],
+    [[1, 1, 1, 1]], [[1], [1], [1], [1]],
+    [[1, 1], [1, 1]],
+    [[1, 1, 1], [1, 1, 1]], [[1, 1], [1, 1], [1, 1]],
+    [[1, 1, 1], [1, 1, 1], [1, 1, 1]],
+]
+
+# Cost of each feature, lower total cost is better, units alone gives the plain solver's tie-break
+FEATURE_WEIGHTS = {"units": 1, "holes": 3, "regions": 2, "blocked_pieces": 4}
+
+NOT_FIRST_COL = FULL_BOARD & ~COL_MASKS[0]
+NOT_LAST_COL = FULL_BOARD & ~COL_MASKS[GRID_SIZE - 1]
+
+def neighbours(mask):
+    "Cells orthogonally next to any cell of a mask"
+    return (mask << 1) & NOT_FIRST_COL | (mask >> 1) & NOT_LAST_COL | (mask << GRID_SIZE) & FULL_BOARD | mask >> GRID_SIZE
+
+def flood(seed, within):
+    "Grow a mask through the cells of within until it stops changing"
+    region = seed & within
+    while True:
+        grown = (region | (region << 1) & NOT_FIRST_COL | (region >> 1) & NOT_LAST_COL | region << GRID_SIZE | region >> GRID_SIZE) & within
+        if grown == region:
+            return region
+        region = grown
+
+def count_regions(mask):
+    "Count the connected groups of cells in a mask"
+    regions = 0
+    while mask:
+        mask &= ~flood(mask & -mask, mask) # Take away the region of the lowest cell
+        regions += 1
+    return regions
+
+def isolated_cells(empty):
+    "Empty cells with no empty neighbour"
+    return empty & ~neighbours(empty)
+
+def cells(mask):
+    "Yield the bit index of every cell in a mask"
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+def piece_shape(piece):
+    "Bit offsets of a piece's cells from its top left corner, and the mask of top left corners that keep it in bounds"
+    return bitboard.fit_table(piece, bitboard.block_placements(piece))
+
+def covering_anchors(mask, shape):
+    "Top left corners where a piece would cover any cell of a mask"
+    offsets, anchors = shape
+    covering = 0
+    for offset in offsets:
+        covering |= mask >> offset
+    return covering & anchors
+
+class BoardFeatures:
+    "Holes, empty regions, fitting pieces and line fill counts of a board, updated from the cells each move changes"
+
+    def __init__(self, board=0, pieces=FIT_PIECES, weights=FEATURE_WEIGHTS):
+        self.weights = weights
+        self.shapes = [piece_shape(piece) for piece in pieces]
+        self.reset(board)
+
+    def reset(self, board):
+        "Compute every feature from scratch for a new starting board and forget the undo history"
+        self.board = board
+        empty = FULL_BOARD & ~board
+        self.hole_mask = isolated_cells(empty)
+        self.regions = count_regions(empty)
+        self.row_fill = [bitboard.count_units(board & mask) for mask in bitboard.ROW_MASKS]
+        self.col_fill = [bitboard.count_units(board & mask) for mask in COL_MASKS]
+        self.fits = [fitting_anchors(empty, shape) for shape in self.shapes] # Piece -> mask of top left corners it fits at
+        self.history = []
+
+    def push(self, new_board):
+        "Move to a board reached by one move, only the cells that changed and their surroundings are looked at"
+        old_board = self.board
+        filled = new_board & ~old_board
+        freed = old_board & ~new_board
+        self.history.append((old_board, self.hole_mask, self.regions, self.fits, filled, freed))
+        old_empty = FULL_BOARD & ~old_board
+        new_empty = FULL_BOARD & ~new_board
+
+        for cell in cells(filled):
+            self.row_fill[cell // GRID_SIZE] += 1
+            self.col_fill[cell % GRID_SIZE] += 1
+        for cell in cells(freed):
+            self.row_fill[cell // GRID_SIZE] -= 1
+            self.col_fill[cell % GRID_SIZE] -= 1
+
+        # Filled cells knock out the corners covering them, freed cells only add corners covering them that now fit
+        if freed:
+            self.fits = [
+                (fits & ~covering_anchors(filled, shape)) | (covering_anchors(freed, shape) & fitting_anchors(new_empty, shape))
+                for fits, shape in zip(self.fits, self.shapes)
+            ]
+        else:
+            self.fits = [fits & ~covering_anchors(filled, shape) for fits, shape in zip(self.fits, self.shapes)]
+
+        # Only cells next to a change can gain or lose hole status
+        changed = filled | freed
+        around = changed | neighbours(changed)
+        self.hole_mask = (self.hole_mask & ~around) | (isolated_cells(new_empty) & around)
+
+        # Only the old regions that were filled into or border freed cells change, recount those
+        old_area = flood(filled | (neighbours(freed) & old_empty), old_empty)
+        new_area = flood((old_area & new_empty) | freed, new_empty)
+        self.regions += count_regions(new_area) - count_regions(old_area) # Diagonal or user-drawn blocks can fill several regions at once
+        self.board = new_board
+
+    def pop(self):
+        "Undo the last push"
+        self.board, self.hole_mask, self.regions, self.fits, filled, freed = self.history.pop()
+        for cell in cells(filled):
+            self.row_fill[cell // GRID_SIZE] -= 1
+            self.col_fill[cell % GRID_SIZE] -= 1
+        for cell in cells(freed):
+            self.row_fill[cell // GRID_SIZE] += 1
+            self.col_fill[cell % GRID_SIZE] += 1
+
+    @property
+    def holes(self):
+        "Empty cells boxed in on every side"
+        return bitboard.count_units(self.hole_mask)
+
+    @property
+    def blocked_pieces(self):
+        "Pieces that fit nowhere on the board"
+        return self.fits.count(0)
+
+    def features(self):
+        "Every feature of the current board by name"
+        return {
+            "units": bitboard.count_units(self.board),
+            "holes": self.holes,
+            "regions": self.regions,
+            "blocked_pieces": self.blocked_pieces,
+            "row_fill": list(self.row_fill),
+            "col_fill": list(self.col_fill),
+        }
+
+    def cost(self):
+        "Weighted sum of the features, lower is better, used by the search in place of the remaining units"
+        weights = self.weights
+        return (
+            weights["units"] * bitboard.count_units(self.board)
+            + weights["holes"] * self.holes
+            + weights["regions"] * self.regions
+            + weights["blocked_pieces"] * self.blocked_pieces
+        )
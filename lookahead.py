@@ -0,0 +1,130 @@
+# Block Blast Calc lookahead by Kozurito
+# Chooses between the best ways to place the current blocks by how well the board they leave survives future deals.
+# Each candidate final board is played forward over sampled deals with a greedy rollout, every candidate sees the same
+# deals (common random numbers) so the comparison isn't swamped by sampling noise
+import random
+import time
+import bitboard
+from solver import GRID_SIZE, SearchProgress, final_board, group_blocks, search_top
+
+DEAL_SIZE = 3 # Blocks per deal
+TURNS = 1 # Future deals to play out
+SAMPLES = 32 # Sampled deal sequences per candidate
+CANDIDATES = 16 # Final boards to compare, the best by score and remaining units
+DEATH_PENALTY = 10 # Lines a rollout loses when a deal can't be placed
+LINE_WEIGHT = 32 # A cleared line outweighs any amount of contact in the rollout policy
+
+# Relative odds of each block being dealt, a rough guess at the game's mix, pass your own table to change it
+DEFAULT_PIECE_FREQUENCIES = [
+    ([[1]], 2),
+    ([[1, 1]], 3), ([[1], [1]], 3),
+    ([[1, 1, 1]], 3), ([[1], [1], [1]], 3),
+    ([[1, 1, 1, 1]], 2), ([[1], [1], [1], [1]], 2),
+    ([[1, 1, 1, 1, 1]], 1), ([[1], [1], [1], [1], [1]], 1),
+    ([[1, 1], [1, 1]], 4),
+    ([[1, 1, 1], [1, 1, 1]], 2), ([[1, 1], [1, 1], [1, 1]], 2),
+    ([[1, 1, 1], [1, 1, 1], [1, 1, 1]], 2),
+    ([[1, 1], [1, 0]], 2), ([[1, 1], [0, 1]], 2), ([[1, 0], [1, 1]], 2), ([[0, 1], [1, 1]], 2),
+    ([[1, 0], [1, 0], [1, 1]], 1), ([[0, 1], [0, 1], [1, 1]], 1), ([[1, 1], [1, 0], [1, 0]], 1), ([[1, 1], [0, 1], [0, 1]], 1),
+    ([[1, 1, 1], [1, 0, 0]], 1), ([[1, 1, 1], [0, 0, 1]], 1), ([[1, 0, 0], [1, 1, 1]], 1), ([[0, 0, 1], [1, 1, 1]], 1),
+    ([[1, 1, 1], [0, 1, 0]], 1), ([[0, 1, 0], [1, 1, 1]], 1), ([[1, 0], [1, 1], [1, 0]], 1), ([[0, 1], [1, 1], [0, 1]], 1),
+    ([[1, 1, 0], [0, 1, 1]], 1), ([[0, 1, 1], [1, 1, 0]], 1), ([[1, 0], [1, 1], [0, 1]], 1), ([[0, 1], [1, 1], [1, 0]], 1),
+    ([[1, 1, 1], [1, 0, 0], [1, 0, 0]], 1), ([[1, 1, 1], [0, 0, 1], [0, 0, 1]], 1),
+    ([[1, 0, 0], [1, 0, 0], [1, 1, 1]], 1), ([[0, 0, 1], [0, 0, 1], [1, 1, 1]], 1),
+]
+
+def _contact_ring(mask):
+    "Split the cells around a placed mask into the neighbours on the board and the number of sides touching a wall"
+    ring = 0
+    walls = 0
+    for bit in range(GRID_SIZE * GRID_SIZE):
+        if not mask >> bit & 1:
+            continue
+        x, y = bit % GRID_SIZE, bit // GRID_SIZE
+        for nx, ny in ((x - 1, y), (x + 1, y), (x, y - 1), (x, y + 1)):
+            if 0 <= nx < GRID_SIZE and 0 <= ny < GRID_SIZE:
+                ring |= 1 << (ny * GRID_SIZE + nx)
+            else:
+                walls += 1
+    return ring & ~mask, walls
+
+def piece_placements(frequencies=DEFAULT_PIECE_FREQUENCIES):
+    "Precompute (mask, contact ring, wall sides) for every placement of every block in a frequency table"
+    return [
+        tuple((mask, *_contact_ring(mask)) for _, _, mask in bitboard.block_placements(block))
+        for block, _ in frequencies
+    ]
+
+def sample_deals(frequencies, turns, samples, seed=0):
+    "Draw the deal sequences every candidate is played against, as block indices into the frequency table"
+    rng = random.Random(seed)
+    weights = [weight for _, weight in frequencies]
+    indices = range(len(frequencies))
+    return [[tuple(rng.choices(indices, weights, k=DEAL_SIZE)) for _ in range(turns)] for _ in range(samples)]
+
+def rollout(board, deals, placements):
+    "Play deals greedily on a bitboard, most lines first and then most contact, returns the lines cleared minus DEATH_PENALTY if a deal doesn't fit"
+    # Works on plain ints with the precomputed masks, no grids are copied or built
+    total_lines = 0
+    for deal in deals:
+        placed = 0 # Bit per slot of the deal already placed
+        for _ in range(len(deal)):
+            best_key = -1
+            for slot, piece in enumerate(deal):
+                if placed >> slot & 1:
+                    continue
+                for mask, ring, walls in placements[piece]:
+                    if board & mask:
+                        continue
+                    filled = board | mask
+                    cleared, lines = bitboard.full_lines(filled)
+                    key = lines * LINE_WEIGHT + bin(filled & ring).count("1") + walls
+                    if key > best_key:
+                        best_key, best_slot, best_board, best_lines = key, slot, filled & ~cleared, lines
+            if best_key < 0: # None of the blocks left fit
+                return total_lines - DEATH_PENALTY
+            placed |= 1 << best_slot
+            board = best_board
+            total_lines += best_lines
+    return total_lines
+
+def candidate_boards(grid, blocks, candidates=CANDIDATES, progress=None):
+    "The best distinct final boards reachable by placing all the blocks, as [(final board, (score, remaining units, moves))] best first"
+    unique_blocks, block_counts = group_blocks(blocks)
+    board = bitboard.grid_to_board(grid)
+    return [(final_board(board, result[2]), result) for result in search_top(board, unique_blocks, block_counts, candidates, progress)]
+
+def evaluate_candidates(grid, blocks, turns=TURNS, samples=SAMPLES, time_budget=None, frequencies=DEFAULT_PIECE_FREQUENCIES, candidates=CANDIDATES, seed=0):
+    "Estimate each candidate's score plus expected future lines, returns [(expected value, score, remaining units, moves)] best first"
+    # The time budget covers finding the candidates too, but at least one sample is always played
+    progress = SearchProgress(time_budget)
+    progress.start()
+    ranked = candidate_boards(grid, blocks, candidates, progress) # Cut short at the deadline with the candidates found so far
+    if not ranked:
+        return []
+    placements = piece_placements(frequencies)
+    deals = sample_deals(frequencies, turns, samples, seed)
+
+    # Sample-major so every candidate has seen the same deals whenever the time budget runs out
+    totals = [0] * len(ranked)
+    played = 0
+    for sample in deals:
+        if progress.deadline is not None and played and time.monotonic() > progress.deadline:
+            break
+        for index, (board, _) in enumerate(ranked):
+            totals[index] += rollout(board, sample, placements)
+        played += 1
+
+    results = [(score + totals[index] / played, score, units, moves) for index, (_, (score, units, moves)) in enumerate(ranked)]
+    results.sort(key=lambda result: result[0], reverse=True) # Stable, so ties keep the plain solver's preference
+    return results
+
+def find_best_placement(grid, blocks, turns=TURNS, samples=SAMPLES, time_budget=None, frequencies=DEFAULT_PIECE_FREQUENCIES, candidates=CANDIDATES, seed=0):
+    "Find the placement whose final board scores best over sampled future deals, same return value as solver.find_best_placement"
+    if len(grid) != GRID_SIZE or len(grid[0]) != GRID_SIZE: # The rollouts use the default board's masks
+        raise ValueError(f"lookahead only supports the {GRID_SIZE}x{GRID_SIZE} board")
+    results = evaluate_candidates(grid, blocks, turns, samples, time_budget, frequencies, candidates, seed)
+    if not results: # Handle no valid moves
+        return 0, 0, []
+    _, best_score, _, best_move_sequence = results[0]
+    return best_score, len(best_move_sequence), best_move_sequence
@@ -0,0 +1,153 @@
+# Block Blast Calc opening book by Kozurito
+# Precomputed answers for every triple of catalog shapes on the empty board (and any other boards it's built with),
+# stored once per canonical orientation in a small zlib-compressed binary file
+#
+#   python opening_book.py                          # build opening_book.bin for the empty board
+#   python opening_book.py --boards boards.jsonl    # also cover the grids listed one per line
+import argparse
+import itertools
+import json
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+import bitboard
+import shapes
+import solver
+from solution_cache import canonical_form, canonical_puzzle, restore_orientation, encode_block
+
+BOOK_PATH = "opening_book.bin"
+BOOK_MAGIC = b"BBOB1"
+PIECES_PER_ENTRY = 3
+SHAPE_ENCODINGS = [encode_block(shape) for shape in shapes.SHAPES]
+
+# Entry layout: board (8 bytes), piece count, piece shape IDs in key order, score, move count, then (shape ID, x, y) per move
+ENTRY_HEAD = struct.Struct("<QB")
+ENTRY_RESULT = struct.Struct("<BB")
+ENTRY_MOVE = struct.Struct("<BBB")
+
+def book_key(board, piece_ids):
+    "Rebuild the canonical_form key of a stored entry"
+    return f"{board:016x}:{','.join(SHAPE_ENCODINGS[piece_id] for piece_id in piece_ids)}"
+
+def encode_entry(board, piece_ids, best_score, moves):
+    "Pack one entry, moves are (shape ID, x, y)"
+    data = ENTRY_HEAD.pack(board, len(piece_ids)) + bytes(piece_ids) + ENTRY_RESULT.pack(best_score, len(moves))
+    return data + b"".join(ENTRY_MOVE.pack(*move) for move in moves)
+
+def decode_entries(data):
+    "Unpack every entry of a decompressed book, yields (board, piece IDs, score, moves)"
+    offset = 0
+    while offset < len(data):
+        board, piece_count = ENTRY_HEAD.unpack_from(data, offset)
+        offset += ENTRY_HEAD.size
+        piece_ids = tuple(data[offset:offset + piece_count])
+        offset += piece_count
+        best_score, move_count = ENTRY_RESULT.unpack_from(data, offset)
+        offset += ENTRY_RESULT.size
+        moves = [ENTRY_MOVE.unpack_from(data, offset + index * ENTRY_MOVE.size) for index in range(move_count)]
+        offset += move_count * ENTRY_MOVE.size
+        yield board, piece_ids, best_score, moves
+
+def replay(board, moves):
+    "Turn stored (shape ID, x, y) moves back into solver moves with their cleared lines"
+    sequence = []
+    for shape_id, x, y in moves:
+        block = shapes.SHAPES[shape_id]
+        board, rows, cols = bitboard.clear_lines(board | bitboard.block_mask(block, x, y))
+        sequence.append(([list(row) for row in block], x, y, len(rows) + len(cols), rows, cols))
+    return sequence
+
+class OpeningBook:
+    "Lookup table of solved positions, falls back on the solver for anything not in the book"
+
+    def __init__(self, path=BOOK_PATH, solve=solver.find_best_placement):
+        self.solve = solve # Called on positions the book doesn't cover
+        self.hits = 0
+        self.misses = 0
+        self.entries = {} # Canonical key -> (canonical board, score, moves as (shape ID, x, y))
+        with open(path, "rb") as book_file:
+            if book_file.read(len(BOOK_MAGIC)) != BOOK_MAGIC:
+                raise ValueError(f"{path} isn't an opening book")
+            data = zlib.decompress(book_file.read())
+        for board, piece_ids, best_score, moves in decode_entries(data):
+            self.entries[book_key(board, piece_ids)] = (board, best_score, moves)
+
+    def find_best_placement(self, grid, blocks):
+        "Book answer when the position is covered, equally good sequences may come back in place of the one the solver would pick"
+        if len(blocks) != PIECES_PER_ENTRY or any(shapes.shape_id(block) is None for block in blocks): # Can't be in the book
+            self.misses += 1
+            return self.solve(grid, blocks)
+        key, symmetry = canonical_form(grid, blocks)
+        result = self.lookup(key)
+        if result is None:
+            self.misses += 1
+            return self.solve(grid, blocks)
+        self.hits += 1
+        best_score, best_moves, canonical_sequence = result
+        return best_score, best_moves, restore_orientation(canonical_sequence, symmetry, blocks)
+
+    def lookup(self, key):
+        "Stored result for a canonical_form key in the canonical orientation, None if it isn't in the book"
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        board, best_score, moves = entry
+        return best_score, len(moves), replay(board, moves)
+
+    def stats(self):
+        "Hit/miss counters and the number of entries"
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": len(self.entries)}
+
+def _solve_entry(job):
+    "Solve one canonical position for the book, returns its packed entry"
+    board, piece_ids = job
+    grid = bitboard.board_to_grid(board)
+    best_score, _, best_moves_sequence = solver.find_best_placement(grid, [shapes.SHAPES[piece_id] for piece_id in piece_ids])
+    moves = [(shapes.shape_id(block), x, y) for block, x, y, _, _, _ in best_moves_sequence]
+    return encode_entry(board, piece_ids, best_score, moves)
+
+def book_jobs(grids):
+    "List every canonical (board, piece IDs) to solve for the given grids, one per symmetry class"
+    jobs = {}
+    for grid in grids:
+        for piece_ids in itertools.combinations_with_replacement(range(len(shapes.SHAPES)), PIECES_PER_ENTRY):
+            blocks = [shapes.SHAPES[piece_id] for piece_id in piece_ids]
+            key, symmetry = canonical_form(grid, blocks)
+            if key not in jobs:
+                canonical_grid, canonical_blocks = canonical_puzzle(grid, blocks, symmetry)
+                jobs[key] = (bitboard.grid_to_board(canonical_grid), tuple(shapes.shape_id(block) for block in canonical_blocks))
+    return list(jobs.values())
+
+def build(grids, path=BOOK_PATH, workers=None):
+    "Solve every shape triple on the given grids and write the book"
+    jobs = book_jobs(grids)
+    print(f"Solving {len(jobs)} positions", file=sys.stderr)
+    start = time.perf_counter()
+    entries = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for count, entry in enumerate(executor.map(_solve_entry, jobs, chunksize=16), 1):
+            entries.append(entry)
+            if count % 500 == 0:
+                print(f"{count}/{len(jobs)} in {time.perf_counter() - start:.0f}s", file=sys.stderr)
+    with open(path, "wb") as book_file:
+        book_file.write(BOOK_MAGIC + zlib.compress(b"".join(entries), 9))
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Build the opening book of solved shape triples.")
+    parser.add_argument("-o", "--output", default=BOOK_PATH, help=f"book file to write (default {BOOK_PATH})")
+    parser.add_argument("--boards", help="JSON lines file of extra grids to cover besides the empty board")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="worker processes (default 0, one per CPU)")
+    args = parser.parse_args(argv)
+
+    grids = [bitboard.board_to_grid(0)]
+    if args.boards:
+        with open(args.boards) as boards_file:
+            grids += [json.loads(line) for line in boards_file if line.strip()]
+    build(grids, args.output, args.workers or None)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# Block Blast Calc parallel solver by Kozurito
+# Splits the root of the search into one task per first move and runs them on a process pool
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import bitboard
+import solver
+from solver import group_blocks, legal_moves, cells_left, is_better, make_search, first_block_after, fewest_units, IdleBounds, LineCapacities, SearchCancelled, SearchProgress, DEADLINE_CHECK_INTERVAL
+
+TASKS_PER_WORKER = 2 # First moves queued per worker, enough to keep every worker busy while the rest wait for a higher floor
+
+# Worker state, set up once per worker process
+_shared_floor = None
+_worker_puzzle = None
+_worker_search = None
+_worker_progress = None
+
+class _SettledCheck(SearchProgress):
+    "Stops a worker's search once another task has a result nothing can beat, its score reaching the root bound with the fewest units"
+
+    def __init__(self):
+        super().__init__()
+        self.bound = None # Root bound of the current puzzle
+
+    def visit(self):
+        self.nodes += 1
+        if self.nodes % DEADLINE_CHECK_INTERVAL == 0 and _shared_floor.value > self.bound:
+            raise SearchCancelled
+
+def _init_worker(shared_floor):
+    "Keep a handle on the floor shared by every worker"
+    global _shared_floor
+    _shared_floor = shared_floor
+
+def settled_floor(score, remaining_units, units, cells, layout):
+    "Lowest score a sequence still needs to win once one scores score with remaining_units left, a tie can't win once the best has the fewest units its score allows"
+    return score + (remaining_units <= fewest_units(units, cells, score, layout))
+
+def _solve_first_move(blocks, layout, new_board, next_counts, next_first, lines_cleared, units, cells, bound):
+    "Search everything after one first move, returns the best (score, remaining units, moves) after it or None"
+    global _worker_puzzle, _worker_search, _worker_progress
+    if (blocks, layout) != _worker_puzzle: # New puzzle, start a fresh search (tasks of the same puzzle share transposition tables)
+        _worker_puzzle = (blocks, layout)
+        _worker_progress = _SettledCheck()
+        _worker_search = make_search(group_blocks(blocks, layout)[0], _worker_progress, layout=layout)
+
+    _worker_progress.bound = bound
+    floor = max(0, _shared_floor.value - lines_cleared)
+    try:
+        result = _worker_search(new_board, next_counts, floor, 1, next_first)
+    except SearchCancelled: # Another task settled the puzzle, nothing below can beat it
+        return None
+    if result is not None:
+        new_floor = settled_floor(result[0] + lines_cleared, result[1], units, cells, layout)
+        with _shared_floor.get_lock():
+            if new_floor > _shared_floor.value: # Let the other workers prune against this result
+                _shared_floor.value = new_floor
+    return result
+
+class ParallelSolver:
+    "Process pool that solves one puzzle at a time, with each first move as a separate task"
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.floor = multiprocessing.Value("i", 0)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(self.floor,))
+
+    def find_best_placement(self, grid, blocks):
+        "Same score and remaining units as solver.find_best_placement, searched in parallel"
+        layout = bitboard.grid_layout(grid)
+        unique_blocks, block_counts = group_blocks(blocks, layout)
+        board = bitboard.grid_to_board(grid)
+        units = bitboard.count_units(board)
+        cells = cells_left(unique_blocks, block_counts)
+        capacities = LineCapacities(unique_blocks, layout)
+        bound = bitboard.max_lines_cleared(board, cells, layout, capacities[block_counts])
+        if sum(block_counts) <= 1 or bound == 0: # Nothing worth splitting, or every way to place the blocks ties
+            return solver.find_best_placement(grid, blocks)
+
+        # First moves are handed out a few at a time like the serial search walks them, so the ones that
+        # can't reach the floor set by earlier results are dropped before they are sent
+        first_moves = legal_moves(board, unique_blocks, block_counts, layout)
+        idle_bounds = IdleBounds(board, block_counts, capacities)
+        self.floor.value = 0
+        results = [None] * len(first_moves)
+        pending = {} # Future -> index of its first move
+        next_move = 0
+        settled = False
+        while pending or (next_move < len(first_moves) and not settled):
+            while next_move < len(first_moves) and not settled and len(pending) < self.workers * TASKS_PER_WORKER:
+                lines_cleared, new_board, next_counts, _ = first_moves[next_move]
+                idle_bound = idle_bounds.get(new_board, next_counts)
+                if idle_bound is None or idle_bound >= self.floor.value:
+                    future = self.executor.submit(_solve_first_move, blocks, layout, new_board, next_counts, first_block_after(block_counts, next_counts, lines_cleared), lines_cleared, units, cells, bound)
+                    pending[future] = next_move
+                next_move += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                if future.cancelled():
+                    continue
+                result = results[index] = future.result()
+                if result is not None and settled_floor(result[0] + first_moves[index][0], result[1], units, cells, layout) > bound: # Nothing can beat it
+                    settled = True
+                    for other in pending:
+                        other.cancel()
+
+        # Pick the winner in the same order the serial search would see the first moves
+        best = None
+        for (lines_cleared, _, _, move), result in zip(first_moves, results):
+            if result is not None and is_better(result[0] + lines_cleared, result[1], best):
+                best = (result[0] + lines_cleared, result[1], [move] + result[2])
+
+        if best is None: # Handle no valid moves
+            return 0, 0, []
+        best_score, _, best_move_sequence = best
+        return best_score, len(best_move_sequence), best_move_sequence
+
+    def close(self):
+        "Shut the worker processes down"
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def find_best_placement(grid, blocks, workers=None):
+    "Solve a single puzzle on a temporary process pool"
+    with ParallelSolver(workers) as parallel_solver:
+        return parallel_solver.find_best_placement(grid, blocks)
@@ -0,0 +1,274 @@
+# Block Blast Calc screenshot reader by Kozurito
+# Reads the board and the blocks in the tray from game screenshots with NumPy (needs NumPy and Pillow), and writes
+# the same puzzle lines batch_solve.py reads, with the time and confidence of every image
+#
+#   python screenshots.py shots/ -o puzzles.jsonl
+#   python screenshots.py shots/ | python batch_solve.py
+#   find shots -name "*.png" | python screenshots.py - --solve
+#   python screenshots.py shots/ --labels labels.jsonl     # accuracy against known answers
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+import solver
+from batch_solve import format_solution
+from solver import GRID_SIZE, MAX_BLOCK_SIZE, remove_blank_lines
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+IN_FLIGHT_PER_WORKER = 4 # Images queued per worker process, enough to keep them busy without reading the whole input first
+EDGE_FRACTION = 0.015 # Strip at the left and right edges that only shows the background
+FOREGROUND_DISTANCE = 60 # Colour distance (summed over RGB) from the background that counts as drawn on top of it
+BOARD_ROW_FRACTION = 0.6 # Board rows are at least this much foreground, the board spans most of the screen width
+MIN_BOARD_PIXELS = 40 # Anything shorter isn't a board
+GAP_FRACTION = 0.01 # Breaks in the board up to this fraction of the image, grid lines blurred into the background, are bridged
+FILL_DISTANCE = 120 # Colour distance from the board frame that marks a cell as filled
+CELL_INSET = 0.25 # Fraction of a cell skipped at each edge when sampling, clear of grid lines and bevels
+CELL_SAMPLES = 5 # Samples per side of every cell
+TRAY_SCALE = 0.5 # Tray cells are drawn at about this fraction of a board cell
+TRAY_HEIGHT = 4 # Board cells below the board searched for the tray
+PIECES = 3
+
+def load_image(path):
+    "Decode a PNG or JPEG into an (height, width, 3) uint8 RGB array"
+    with Image.open(path) as image:
+        return np.asarray(image.convert("RGB"))
+
+def row_background(image, edge=EDGE_FRACTION):
+    "Background colour of every row, the median of thin strips at the left and right edges, so vertical gradients are followed"
+    strip = max(1, int(image.shape[1] * edge))
+    edges = np.concatenate([image[:, :strip], image[:, -strip:]], axis=1)
+    return np.median(edges, axis=1)
+
+def foreground_mask(image, background, threshold=FOREGROUND_DISTANCE):
+    "Pixels that differ from their row's background, the board and the blocks"
+    distance = np.abs(image.astype(np.int16) - background[:, None, :].astype(np.int16)).sum(axis=2)
+    return distance > threshold
+
+def longest_run(flags):
+    "(start, stop) of the longest run of True values, (0, 0) if there is none"
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.astype(np.int8), [0]))))
+    if len(edges) == 0:
+        return 0, 0
+    starts, stops = edges[0::2], edges[1::2]
+    longest = np.argmax(stops - starts)
+    return int(starts[longest]), int(stops[longest])
+
+def close_gaps(flags, gap):
+    "Fill runs of up to gap False values between True ones, a dilation followed by an erosion"
+    window = 2 * gap + 1
+    dilated = sliding_window_view(np.pad(flags, gap, constant_values=False), window).any(axis=1)
+    return sliding_window_view(np.pad(dilated, gap, constant_values=True), window).all(axis=1)
+
+def find_board(mask, fraction=BOARD_ROW_FRACTION):
+    "Bounding box (top, bottom, left, right) of the board, the tallest band of rows that are mostly foreground"
+    gap = max(1, int(max(mask.shape) * GAP_FRACTION))
+    top, bottom = longest_run(close_gaps(mask.mean(axis=1) >= fraction, gap))
+    if bottom - top < MIN_BOARD_PIXELS:
+        raise ValueError("no board found")
+    left, right = longest_run(close_gaps(mask[top:bottom].mean(axis=0) >= fraction, gap))
+    if right - left < MIN_BOARD_PIXELS:
+        raise ValueError("no board found")
+    return top, bottom, left, right
+
+def sample_cells(image, top, left, cell_height, cell_width, rows, cols, inset=CELL_INSET, samples=CELL_SAMPLES):
+    "Values on a samples x samples lattice inside every cell of a grid, as (rows, cols, samples * samples, channels)"
+    if image.ndim == 2:
+        image = image[:, :, None]
+    offsets = inset + (1 - 2 * inset) * (np.arange(samples) + 0.5) / samples # Sample positions as fractions of a cell
+    ys = (top + (np.arange(rows)[:, None] + offsets) * cell_height).astype(int).ravel()
+    xs = (left + (np.arange(cols)[:, None] + offsets) * cell_width).astype(int).ravel()
+    lattice = image[ys[:, None], xs[None, :]] # One gather for every sample of every cell
+    return lattice.reshape(rows, samples, cols, samples, -1).transpose(0, 2, 1, 3, 4).reshape(rows, cols, samples * samples, -1)
+
+def confidence(values, threshold):
+    "How far values sit from a threshold, 0 on it and 1 at a full threshold away or more"
+    return np.clip(np.abs(values - threshold) / threshold, 0, 1)
+
+def read_board(image, box, width=GRID_SIZE, height=GRID_SIZE, threshold=FILL_DISTANCE):
+    "Read the grid inside a board box, returns (grid, confidence)"
+    top, bottom, left, right = box
+    # The frame around the cells is drawn in the empty cell colour, use a ring just inside the box as the reference
+    ring = np.concatenate([
+        image[top:top + 2, left:right].reshape(-1, 3), image[bottom - 2:bottom, left:right].reshape(-1, 3),
+        image[top:bottom, left:left + 2].reshape(-1, 3), image[top:bottom, right - 2:right].reshape(-1, 3),
+    ])
+    empty_colour = np.median(ring, axis=0)
+    samples = sample_cells(image, top, left, (bottom - top) / height, (right - left) / width, height, width)
+    distance = np.abs(np.median(samples, axis=2) - empty_colour).sum(axis=2)
+    filled = distance > threshold
+    return filled.astype(int).tolist(), float(confidence(distance, threshold).min())
+
+def piece_box(mask, min_pixels):
+    "Bounding box (top, bottom, left, right) of the foreground in a tray slot, None if the slot is empty"
+    rows = np.flatnonzero(mask.sum(axis=1) >= min_pixels)
+    if len(rows) == 0:
+        return None
+    cols = np.flatnonzero(mask[rows[0]:rows[-1] + 1].sum(axis=0) >= min_pixels)
+    if len(cols) == 0:
+        return None
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1
+
+def tray_cell_size(boxes, expected):
+    "The tray cell size near the expected one that makes every piece the closest to a whole number of cells, and how close that is"
+    sizes = np.array([size for top, bottom, left, right in boxes for size in (bottom - top, right - left)], dtype=float)
+    candidates = expected * np.linspace(0.8, 1.25, 91) # Narrow enough that a cell can't be mistaken for two
+    cells = sizes[None, :] / candidates[:, None]
+    error = np.abs(cells - np.clip(np.rint(cells), 1, MAX_BLOCK_SIZE)).max(axis=1)
+    best = int(np.argmin(error))
+    return candidates[best], float(error[best])
+
+def read_tray(mask, box, board_cell, pieces=PIECES, scale=TRAY_SCALE):
+    "Read the blocks in the tray under a board box, left to right, returns (blocks, confidence)"
+    _, bottom, left, right = box
+    tray_top = bottom + int(board_cell * 0.25) # Clear of the board's shadow
+    tray = mask[tray_top:tray_top + int(board_cell * TRAY_HEIGHT)]
+    expected = board_cell * scale
+    min_pixels = max(2, int(expected * 0.25))
+    slots = np.linspace(left, right, pieces + 1).astype(int)
+    boxes = []
+    for slot_left, slot_right in zip(slots, slots[1:]):
+        found = piece_box(tray[:, slot_left:slot_right], min_pixels)
+        if found is not None:
+            piece_top, piece_bottom, piece_left, piece_right = found
+            boxes.append((piece_top, piece_bottom, slot_left + piece_left, slot_left + piece_right))
+    if not boxes: # Every block of the deal has been played
+        return [], 1.0
+    cell_size, error = tray_cell_size(boxes, expected)
+    blocks = []
+    lowest = 1 - 2 * error # Pieces that aren't a whole number of cells are suspect
+    for piece_top, piece_bottom, piece_left, piece_right in boxes:
+        rows = int(np.clip(np.rint((piece_bottom - piece_top) / cell_size), 1, MAX_BLOCK_SIZE))
+        cols = int(np.clip(np.rint((piece_right - piece_left) / cell_size), 1, MAX_BLOCK_SIZE))
+        samples = sample_cells(tray, piece_top, piece_left, (piece_bottom - piece_top) / rows, (piece_right - piece_left) / cols, rows, cols)
+        coverage = samples.mean(axis=(2, 3))
+        padded = np.zeros((MAX_BLOCK_SIZE, MAX_BLOCK_SIZE), dtype=int) # Trimmed the same way as a block drawn in the editor
+        padded[:rows, :cols] = coverage >= 0.5
+        block = remove_blank_lines(padded.tolist())
+        if block:
+            blocks.append(block)
+        lowest = min(lowest, float(confidence(coverage, 0.5).min()))
+    return blocks, max(0.0, lowest)
+
+def read_screenshot(image, width=GRID_SIZE, height=GRID_SIZE, pieces=PIECES, tray_scale=TRAY_SCALE):
+    "Find and read the board and tray of one screenshot, returns {grid, blocks, confidence}"
+    mask = foreground_mask(image, row_background(image))
+    box = find_board(mask)
+    grid, board_confidence = read_board(image, box, width, height)
+    blocks, tray_confidence = read_tray(mask, box, (box[3] - box[2]) / width, pieces, tray_scale)
+    return {"grid": grid, "blocks": blocks, "confidence": round(min(board_confidence, tray_confidence), 3)}
+
+def image_paths(inputs):
+    "Expand files, directories (their images in name order) and - (one path per line on stdin) into image paths"
+    for source in inputs:
+        if source == "-":
+            yield from (line.strip() for line in sys.stdin if line.strip())
+        elif os.path.isdir(source):
+            for name in sorted(os.listdir(source)):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(source, name)
+        else:
+            yield source
+
+def read_job(job):
+    "Read one screenshot for the process pool, errors become part of the record"
+    path, width, height, pieces, tray_scale, solve = job
+    record = {"id": path}
+    start = time.perf_counter()
+    try:
+        record.update(read_screenshot(load_image(path), width, height, pieces, tray_scale))
+    except (OSError, ValueError) as error: # Unreadable image or no board in it, report it without stopping the batch
+        record["error"] = str(error)
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    if solve and "error" not in record:
+        record["solution"] = format_solution(*solver.find_best_placement(record["grid"], record["blocks"]))
+    return record
+
+def score_labels(records, labels):
+    "Compare read positions against labelled ones (matched by file name), returns the accuracy counts"
+    checked = boards = cells = total_cells = deals = 0
+    for record in records:
+        label = labels.get(os.path.basename(record["id"]))
+        if label is None:
+            continue
+        checked += 1
+        if "error" in record:
+            total_cells += sum(len(row) for row in label["grid"])
+            continue
+        boards += record["grid"] == label["grid"]
+        cells += sum(read == known for read_row, known_row in zip(record["grid"], label["grid"]) for read, known in zip(read_row, known_row))
+        total_cells += sum(len(row) for row in label["grid"])
+        deals += record["blocks"] == label["blocks"]
+    return {
+        "labelled": checked,
+        "boards_exact": boards / checked if checked else 0.0,
+        "cell_accuracy": cells / total_cells if total_cells else 0.0,
+        "blocks_exact": deals / checked if checked else 0.0,
+    }
+
+def stream_map(executor, function, items, window):
+    "Like executor.map, but only keeps window items in flight so a lazy input is read as records go out instead of all up front"
+    pending = collections.deque()
+    for item in items:
+        pending.append(executor.submit(function, item))
+        while pending and (len(pending) >= window or pending[0].done()): # Hand finished records on without waiting for the window to fill
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Read Block Blast positions from screenshots as batch_solve.py puzzle lines.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories of PNG/JPEG images, or - to read paths from stdin")
+    parser.add_argument("-o", "--output", default="-", help="file to write puzzle lines to, or - for stdout (default)")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="worker processes (default 1, 0 for one per CPU)")
+    parser.add_argument("--width", type=int, default=GRID_SIZE, help=f"board width in cells (default {GRID_SIZE})")
+    parser.add_argument("--height", type=int, help="board height in cells (default the width)")
+    parser.add_argument("--pieces", type=int, default=PIECES, help=f"tray slots (default {PIECES})")
+    parser.add_argument("--tray-scale", type=float, default=TRAY_SCALE, help=f"tray cell size as a fraction of a board cell (default {TRAY_SCALE})")
+    parser.add_argument("--solve", action="store_true", help="also solve every position and add the solution to its line")
+    parser.add_argument("--labels", help="JSON lines of known positions, id is the image file name, to report accuracy")
+    parser.add_argument("--min-confidence", type=float, default=0.5, help="count reads below this confidence as doubtful (default 0.5)")
+    args = parser.parse_args(argv)
+
+    height = args.width if args.height is None else args.height
+    jobs = ((path, args.width, height, args.pieces, args.tray_scale, args.solve) for path in image_paths(args.inputs))
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    executor = ProcessPoolExecutor(args.workers or None) if args.workers != 1 else None
+    records = []
+    start = time.perf_counter()
+    try:
+        window = IN_FLIGHT_PER_WORKER * (args.workers or os.cpu_count() or 1)
+        for record in stream_map(executor, read_job, jobs, window) if executor else map(read_job, jobs):
+            records.append(record)
+            output_file.write(json.dumps(record) + "\n")
+            output_file.flush()
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if output_file is not sys.stdout:
+            output_file.close()
+
+    elapsed = time.perf_counter() - start
+    read = [record for record in records if "error" not in record]
+    summary = {
+        "images": len(records),
+        "failed": len(records) - len(read),
+        "doubtful": sum(record["confidence"] < args.min_confidence for record in read),
+        "seconds": elapsed,
+        "images_per_second": len(records) / elapsed if elapsed else 0.0,
+        "mean_image_seconds": sum(record["seconds"] for record in records) / len(records) if records else 0.0,
+    }
+    if args.labels:
+        with open(args.labels) as labels_file:
+            labels = {label["id"]: label for label in map(json.loads, filter(str.strip, labels_file))}
+        summary.update(score_labels(records, labels))
+    print(json.dumps(summary), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Block Blast Calc shape catalog by Kozurito
+# Every block the game deals, each with a fixed ID (its index), its cell count and its placement masks, computed once
+import bitboard
+
+SHAPES = [
+    # Single cell and straight lines
+    [[1]],
+    [[1, 1]], [[1], [1]],
+    [[1, 1, 1]], [[1], [1], [1]],
+    [[1, 1, 1, 1]], [[1], [1], [1], [1]],
+    [[1, 1, 1, 1, 1]], [[1], [1], [1], [1], [1]],
+    # Rectangles
+    [[1, 1], [1, 1]],
+    [[1, 1, 1], [1, 1, 1]], [[1, 1], [1, 1], [1, 1]],
+    [[1, 1, 1], [1, 1, 1], [1, 1, 1]],
+    # Three cell corners
+    [[1, 1], [1, 0]], [[1, 1], [0, 1]], [[1, 0], [1, 1]], [[0, 1], [1, 1]],
+    # Four cell Ls
+    [[1, 0], [1, 0], [1, 1]], [[0, 1], [0, 1], [1, 1]], [[1, 1], [1, 0], [1, 0]], [[1, 1], [0, 1], [0, 1]],
+    [[1, 1, 1], [1, 0, 0]], [[1, 1, 1], [0, 0, 1]], [[1, 0, 0], [1, 1, 1]], [[0, 0, 1], [1, 1, 1]],
+    # Ts
+    [[1, 1, 1], [0, 1, 0]], [[0, 1, 0], [1, 1, 1]], [[1, 0], [1, 1], [1, 0]], [[0, 1], [1, 1], [0, 1]],
+    # S and Z
+    [[1, 1, 0], [0, 1, 1]], [[0, 1, 1], [1, 1, 0]], [[1, 0], [1, 1], [0, 1]], [[0, 1], [1, 1], [1, 0]],
+    # Five cell corners
+    [[1, 1, 1], [1, 0, 0], [1, 0, 0]], [[1, 1, 1], [0, 0, 1], [0, 0, 1]],
+    [[1, 0, 0], [1, 0, 0], [1, 1, 1]], [[0, 0, 1], [0, 0, 1], [1, 1, 1]],
+    # Diagonals
+    [[1, 0], [0, 1]], [[0, 1], [1, 0]],
+    [[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 0, 1], [0, 1, 0], [1, 0, 0]],
+]
+
+SHAPE_CELLS = [sum(map(sum, shape)) for shape in SHAPES]
+SHAPE_PLACEMENTS = [bitboard.block_placements(shape) for shape in SHAPES] # (x, y, mask) for every in-bounds offset
+SHAPE_IDS = {tuple(map(tuple, shape)): shape_id for shape_id, shape in enumerate(SHAPES)}
+
+def shape_id(block):
+    "Look up the catalog ID of a trimmed block, None if the block isn't a known shape"
+    return SHAPE_IDS.get(tuple(map(tuple, block)))
+
+def block_placements(block, layout=bitboard.DEFAULT_LAYOUT):
+    "Placement masks of a block, from the catalog when it's a known shape on the default board"
+    known_id = shape_id(block) if layout is bitboard.DEFAULT_LAYOUT else None
+    return bitboard.block_placements(block, layout) if known_id is None else SHAPE_PLACEMENTS[known_id]
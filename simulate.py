@@ -0,0 +1,188 @@
+# Block Blast Calc self-play simulator by Kozurito
+# Plays seeded games until the board is cooked to compare solver strategies. Every strategy plays the same seeds,
+# so their results can be compared game by game. Finished games are appended to a checkpoint file and skipped on restart
+#
+#   python simulate.py --games 1000 --strategy plain --strategy features -c games.jsonl
+import argparse
+import itertools
+import json
+import math
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import lookahead
+import solver
+from features import BoardFeatures
+from solver import GRID_SIZE, place_block, clear_lines
+
+MAX_TURNS = 1000 # Games still going after this many deals are stopped and counted as capped
+PIECE_FREQUENCIES = lookahead.DEFAULT_PIECE_FREQUENCIES
+
+_evaluator = None # Per process, BoardFeatures keeps its precomputed tables between games
+
+def _features_strategy(grid, blocks):
+    "Plain search with the board features breaking ties"
+    global _evaluator
+    if _evaluator is None:
+        _evaluator = BoardFeatures()
+    return solver.find_best_placement(grid, blocks, evaluator=_evaluator)
+
+STRATEGIES = {
+    "plain": solver.find_best_placement,
+    "features": _features_strategy,
+    "lookahead": lookahead.find_best_placement,
+}
+
+def deal(rng, frequencies=PIECE_FREQUENCIES):
+    "Draw one deal of blocks, copied so a strategy can't change the table"
+    blocks = rng.choices([block for block, _ in frequencies], [weight for _, weight in frequencies], k=lookahead.DEAL_SIZE)
+    return [[list(row) for row in block] for block in blocks]
+
+def apply_moves(grid, moves):
+    "Play moves on the grid with place_block and clear_lines, returns the lines cleared"
+    lines = 0
+    for block, x, y, _, _, _ in moves:
+        place_block(grid, block, x, y)
+        lines += clear_lines(grid)[0]
+    return lines
+
+def last_moves(grid, blocks):
+    "Best placement of as many of the blocks as still fit, for the deal a game ends on"
+    for size in range(len(blocks) - 1, 0, -1):
+        best = None
+        for subset in itertools.combinations(blocks, size):
+            result = solver.find_best_placement(grid, list(subset))
+            if result[2] and (best is None or result[0] > best[0]):
+                best = result
+        if best is not None:
+            return best[2]
+    return []
+
+def play_game(strategy, seed, max_turns=MAX_TURNS):
+    "Play one game from an empty board, returns its record"
+    find_best_placement = STRATEGIES[strategy]
+    rng = random.Random(seed)
+    grid = [[0 for _ in range(GRID_SIZE)] for _ in range(GRID_SIZE)]
+    lines = 0
+    pieces = 0
+    turns = 0
+    while turns < max_turns:
+        blocks = deal(rng)
+        _, _, moves = find_best_placement(grid, blocks)
+        if not moves: # Cooked, place what still fits and stop
+            moves = last_moves(grid, blocks)
+            lines += apply_moves(grid, moves)
+            pieces += len(moves)
+            break
+        lines += apply_moves(grid, moves)
+        pieces += len(moves)
+        turns += 1
+    return {"strategy": strategy, "seed": seed, "lines": lines, "turns": turns, "pieces": pieces, "capped": turns >= max_turns}
+
+def _play_job(job):
+    "Unpack a (strategy, seed, max turns) job for the process pool"
+    return play_game(*job)
+
+def load_checkpoint(path):
+    "Read the games already played, keyed by (strategy, seed)"
+    records = {}
+    try:
+        with open(path) as checkpoint_file:
+            for line in checkpoint_file:
+                if line.strip():
+                    record = json.loads(line)
+                    records[(record["strategy"], record["seed"])] = record
+    except FileNotFoundError: # Nothing played yet
+        pass
+    return records
+
+def distribution(values):
+    "Mean with a 95% confidence interval and a few percentiles"
+    ordered = sorted(values)
+    spread = statistics.stdev(ordered) if len(ordered) > 1 else 0.0
+    return {
+        "mean": statistics.fmean(ordered),
+        "ci95": 1.96 * spread / math.sqrt(len(ordered)),
+        "stdev": spread,
+        "min": ordered[0],
+        "p10": ordered[len(ordered) // 10],
+        "p50": ordered[len(ordered) // 2],
+        "p90": ordered[len(ordered) * 9 // 10],
+        "max": ordered[-1],
+    }
+
+def summarize(records, strategies, seeds):
+    "Score and survival distributions per strategy, and paired differences against the first strategy"
+    summary = {}
+    for strategy in strategies:
+        games = [records[(strategy, seed)] for seed in seeds if (strategy, seed) in records]
+        if not games:
+            continue
+        summary[strategy] = {
+            "games": len(games),
+            "capped": sum(game["capped"] for game in games),
+            "lines": distribution([game["lines"] for game in games]),
+            "turns": distribution([game["turns"] for game in games]),
+        }
+    baseline = strategies[0]
+    for strategy in strategies[1:]:
+        paired = [seed for seed in seeds if (strategy, seed) in records and (baseline, seed) in records]
+        if paired: # Same deals on both sides, so the per-game difference cancels most of the luck
+            summary[strategy][f"lines_vs_{baseline}"] = distribution([records[(strategy, seed)]["lines"] - records[(baseline, seed)]["lines"] for seed in paired])
+    return summary
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Play seeded games headlessly to compare solver strategies.")
+    parser.add_argument("-n", "--games", type=int, default=100, help="games per strategy (default 100)")
+    parser.add_argument("--strategy", action="append", choices=sorted(STRATEGIES), help="strategy to play, repeatable, the first is the baseline (default plain)")
+    parser.add_argument("--seed", type=int, default=0, help="first game seed (default 0)")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS, help=f"deals before a game is stopped (default {MAX_TURNS})")
+    parser.add_argument("-c", "--checkpoint", help="JSON lines file finished games are appended to and resumed from")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="worker processes (default 0, one per CPU, 1 plays in this process)")
+    parser.add_argument("-o", "--output", default="-", help="file to write the JSON summary to, or - for stdout (default)")
+    args = parser.parse_args(argv)
+
+    strategies = args.strategy or ["plain"]
+    seeds = range(args.seed, args.seed + args.games)
+    records = load_checkpoint(args.checkpoint) if args.checkpoint else {}
+    jobs = [(strategy, seed, args.max_turns) for seed in seeds for strategy in strategies if (strategy, seed) not in records]
+    print(f"{len(jobs)} games to play, {len(seeds) * len(strategies) - len(jobs)} already in the checkpoint", file=sys.stderr)
+
+    checkpoint_file = open(args.checkpoint, "a") if args.checkpoint else None
+    executor = ProcessPoolExecutor(args.workers or None) if args.workers != 1 else None
+    start = time.perf_counter()
+    try:
+        results = executor.map(_play_job, jobs, chunksize=4) if executor else map(_play_job, jobs)
+        for played, record in enumerate(results, 1):
+            records[(record["strategy"], record["seed"])] = record
+            if checkpoint_file:
+                checkpoint_file.write(json.dumps(record) + "\n")
+                checkpoint_file.flush()
+            if played % 10 == 0 or played == len(jobs):
+                elapsed = time.perf_counter() - start
+                print(f"{played}/{len(jobs)} games, {played / elapsed:.2f} games/s", file=sys.stderr)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    elapsed = time.perf_counter() - start
+    results = {
+        "games_played": len(jobs),
+        "seconds": elapsed,
+        "games_per_second": len(jobs) / elapsed if elapsed else 0.0,
+        "strategies": summarize(records, strategies, seeds),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# Block Blast Calc solution cache by Kozurito
+# Persistent SQLite cache of solver results. Positions are stored in a canonical orientation so
+# mirrored, rotated and transposed positions share one entry
+import functools
+import json
+import sqlite3
+import time
+import bitboard
+import solver
+from solver import GRID_SIZE
+
+# Every flip/transpose of the square board as (transpose, flip_x, flip_y), applied in that order
+SYMMETRIES = [(transpose, flip_x, flip_y) for transpose in (False, True) for flip_x in (False, True) for flip_y in (False, True)]
+
+def map_point(symmetry, x, y, width, height):
+    "Find where the cell (x, y) of a width x height box lands under a symmetry"
+    transpose, flip_x, flip_y = symmetry
+    if transpose:
+        x, y, width, height = y, x, height, width
+    if flip_x:
+        x = width - 1 - x
+    if flip_y:
+        y = height - 1 - y
+    return x, y
+
+def _find_inverse(symmetry):
+    "Find the symmetry that undoes the given one"
+    probes = [(1, 2), (3, 1)]
+    for candidate in SYMMETRIES:
+        if all(map_point(candidate, *map_point(symmetry, x, y, GRID_SIZE, GRID_SIZE), GRID_SIZE, GRID_SIZE) == (x, y) for x, y in probes):
+            return candidate
+
+INVERSES = {symmetry: _find_inverse(symmetry) for symmetry in SYMMETRIES}
+
+def _byte_tables(symmetry):
+    "Precompute where every value of every byte of a bitboard lands under a symmetry"
+    cell_count = GRID_SIZE * GRID_SIZE
+    targets = []
+    for bit in range(cell_count):
+        x, y = map_point(symmetry, bit % GRID_SIZE, bit // GRID_SIZE, GRID_SIZE, GRID_SIZE)
+        targets.append(y * GRID_SIZE + x)
+    tables = []
+    for start in range(0, cell_count, 8):
+        table = []
+        for value in range(256):
+            mapped = 0
+            for offset in range(min(8, cell_count - start)):
+                if value >> offset & 1:
+                    mapped |= 1 << targets[start + offset]
+            table.append(mapped)
+        tables.append(table)
+    return tables
+
+BYTE_TABLES = {symmetry: _byte_tables(symmetry) for symmetry in SYMMETRIES}
+
+def transform_board(board, symmetry):
+    "Apply a symmetry to a bitboard, one table lookup per byte"
+    new_board = 0
+    for table in BYTE_TABLES[symmetry]:
+        new_board |= table[board & 0xFF]
+        board >>= 8
+    return new_board
+
+def transform_grid(grid, symmetry):
+    "Apply a symmetry to a grid or a block"
+    height, width = len(grid), len(grid[0])
+    new_width, new_height = (height, width) if symmetry[0] else (width, height)
+    new_grid = [[0 for _ in range(new_width)] for _ in range(new_height)]
+    for y, row in enumerate(grid):
+        for x, cell in enumerate(row):
+            new_x, new_y = map_point(symmetry, x, y, width, height)
+            new_grid[new_y][new_x] = cell
+    return new_grid
+
+def transform_lines(rows, cols, symmetry):
+    "Map cleared rows and columns through a symmetry, a transpose turns rows into columns"
+    new_rows = []
+    new_cols = []
+    for index, is_row in [(row, True) for row in rows] + [(col, False) for col in cols]:
+        x, y = (0, index) if is_row else (index, 0)
+        new_x, new_y = map_point(symmetry, x, y, GRID_SIZE, GRID_SIZE)
+        if is_row != symmetry[0]:
+            new_rows.append(new_y)
+        else:
+            new_cols.append(new_x)
+    return sorted(new_rows), sorted(new_cols)
+
+def transform_move(move, symmetry):
+    "Apply a symmetry to a move, the block keeps its top left corner as the anchor"
+    block, x, y, lines_cleared, rows, cols = move
+    corner_1 = map_point(symmetry, x, y, GRID_SIZE, GRID_SIZE)
+    corner_2 = map_point(symmetry, x + len(block[0]) - 1, y + len(block) - 1, GRID_SIZE, GRID_SIZE)
+    new_rows, new_cols = transform_lines(rows, cols, symmetry)
+    return (transform_grid(block, symmetry), min(corner_1[0], corner_2[0]), min(corner_1[1], corner_2[1]), lines_cleared, new_rows, new_cols)
+
+def encode_block(block):
+    "Encode a block as text, for example [[1, 1], [1, 0]] becomes 11/10"
+    return "/".join("".join(str(cell) for cell in row) for row in block)
+
+@functools.lru_cache(maxsize=None)
+def _block_encodings(encoded_block):
+    "Encode a block under every symmetry, blocks come from a small set so this is cached"
+    block = [[int(cell) for cell in row] for row in encoded_block.split("/")]
+    return {symmetry: encode_block(transform_grid(block, symmetry)) for symmetry in SYMMETRIES}
+
+def canonical_form(grid, blocks):
+    "Pick the orientation with the smallest key, returns (key, symmetry)"
+    start_board = bitboard.grid_to_board(grid)
+    if len(grid) != GRID_SIZE or len(grid[0]) != GRID_SIZE: # The symmetry tables only cover the default board, other sizes are keyed as given
+        pieces = sorted(encode_block(block) for block in blocks)
+        return f"{len(grid[0])}x{len(grid)}:{start_board:x}:{','.join(pieces)}", SYMMETRIES[0]
+    encodings = [_block_encodings(encode_block(block)) for block in blocks]
+    best = None
+    for symmetry in SYMMETRIES:
+        board = transform_board(start_board, symmetry)
+        pieces = sorted(encoding[symmetry] for encoding in encodings)
+        key = f"{board:016x}:{','.join(pieces)}"
+        if best is None or key < best[0]:
+            best = (key, symmetry)
+    return best
+
+def canonical_puzzle(grid, blocks, symmetry):
+    "Turn a position into its canonical orientation, with the blocks in key order"
+    canonical_blocks = sorted((transform_grid(block, symmetry) for block in blocks), key=encode_block)
+    return transform_grid(grid, symmetry), canonical_blocks
+
+def restore_orientation(canonical_sequence, symmetry, blocks):
+    "Map moves found in the canonical orientation back to the one the position was given in, reusing the caller's block objects"
+    inverse = INVERSES[symmetry]
+    best_moves_sequence = []
+    for move in canonical_sequence:
+        block, x, y, lines_cleared, rows, cols = transform_move(move, inverse)
+        block = next((original for original in blocks if original == block), block)
+        best_moves_sequence.append((block, x, y, lines_cleared, rows, cols))
+    return best_moves_sequence
+
+class SolutionCache:
+    "Size-capped LRU cache of find_best_placement results in an SQLite file"
+
+    def __init__(self, path, max_entries=100000, solve=solver.find_best_placement):
+        self.path = path
+        self.max_entries = max_entries
+        self.solve = solve # Called on misses, swap in a parallel solver's find_best_placement if needed
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solutions (key TEXT PRIMARY KEY, result TEXT NOT NULL, last_used REAL NOT NULL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS solutions_last_used ON solutions (last_used)")
+        self.connection.commit()
+        self.entries = self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0]
+
+    def find_best_placement(self, grid, blocks):
+        "Cached solver.find_best_placement, equally good sequences may come back in place of the one the solver would pick"
+        key, symmetry = canonical_form(grid, blocks)
+        row = self.connection.execute("SELECT result FROM solutions WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.hits += 1
+            self.connection.execute("UPDATE solutions SET last_used = ? WHERE key = ?", (time.time(), key)) # Committed with the next insert or on close
+            best_score, best_moves, canonical_sequence = json.loads(row[0])
+        else:
+            self.misses += 1
+            best_score, best_moves, canonical_sequence = self.solve(*canonical_puzzle(grid, blocks, symmetry))
+            self.store(key, [best_score, best_moves, canonical_sequence])
+        return best_score, best_moves, restore_orientation(canonical_sequence, symmetry, blocks)
+
+    def store(self, key, result):
+        "Insert a result and evict the least recently used entries past max_entries"
+        row = (key, json.dumps(result), time.time())
+        if self.connection.execute("INSERT OR IGNORE INTO solutions (key, result, last_used) VALUES (?, ?, ?)", row).rowcount:
+            self.entries += 1
+        else: # Another process sharing the file stored the same position first
+            self.connection.execute("UPDATE solutions SET result = ?, last_used = ? WHERE key = ?", row[1:] + row[:1])
+        if self.entries > self.max_entries:
+            self.entries = self.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0] # Other processes change the count too
+        if self.entries > self.max_entries:
+            self.connection.execute(
+                "DELETE FROM solutions WHERE key IN (SELECT key FROM solutions ORDER BY last_used LIMIT ?)",
+                (self.entries - self.max_entries,),
+            )
+            self.entries = self.max_entries
+        self.connection.commit()
+
+    def stats(self):
+        "Hit/miss counters and the number of stored entries"
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0, "entries": self.entries}
+
+    def close(self):
+        "Commit pending LRU updates and close the file"
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
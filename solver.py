@@ -0,0 +1,632 @@
+# Block Blast Calc solver by Kozurito
+# Headless solver functions, importable without pygame
+import functools
+import heapq
+import itertools
+import json
+import time
+import bitboard
+import shapes
+
+# Constants
+GRID_SIZE = bitboard.GRID_SIZE
+MAX_BLOCK_SIZE = 5
+DEADLINE_CHECK_INTERVAL = 1024 # Nodes between clock reads when a search has a time budget
+MAX_TABLE_ENTRIES = 1 << 19 # Entries a transposition table keeps before the older half is dropped, roughly 150 bytes each
+
+class SearchCancelled(Exception):
+    "Raised inside the search when it is cancelled or runs out of time"
+
+class SearchProgress:
+    "Progress of a running search, safe to read from another thread while the search runs"
+
+    def __init__(self, time_budget=None):
+        self.time_budget = time_budget # Seconds, or None for no limit
+        self.deadline = None
+        self.nodes = 0
+        self.best = None # (score, remaining units, moves) of the best full sequence found so far
+        self.cancelled = False
+        self.timed_out = False
+        self.done = False
+
+    def start(self):
+        "Start the clock on the time budget"
+        if self.time_budget is not None:
+            self.deadline = time.monotonic() + self.time_budget
+
+    def cancel(self):
+        "Ask the search to stop, it returns the best sequence found so far"
+        self.cancelled = True
+
+    def visit(self):
+        "Count a node and stop the search if it was cancelled or ran out of time"
+        self.nodes += 1
+        if self.cancelled:
+            raise SearchCancelled
+        if self.deadline is not None and self.nodes % DEADLINE_CHECK_INTERVAL == 0 and time.monotonic() > self.deadline:
+            self.timed_out = True
+            raise SearchCancelled
+
+class SearchStats:
+    "Optional search counters, filled in only when passed to find_best_placement"
+
+    def __init__(self):
+        self.nodes_by_depth = [] # Boards reached after placing depth blocks
+        self.lines_by_depth = [] # Lines cleared by the moves made at each depth
+        self.placements_tried = 0
+        self.placements_rejected = 0 # Overlapped a filled cell
+        self.commutation_skips = 0 # Legal but cleared nothing with an earlier block than the order allows, the same boards come up in block order
+        self.transposition_hits = 0
+        self.fail_low_hits = 0
+        self.bound_cutoffs = 0 # Nodes cut because the line-clear bound couldn't reach the floor
+        self.settled_exits = 0 # Nodes that stopped early because the best sequence found already clears every line in reach with the fewest units possible
+        self.dead_boards = 0 # Nodes cut because a remaining block couldn't fit anywhere, even after clearing lines
+        self.first_blocks = {} # Block placed first -> time and nodes spent below it
+        self.seconds = 0.0
+
+    def count_node(self, depth, lines_cleared=0):
+        "Count a board reached at the given depth and the lines the move into it cleared"
+        while len(self.nodes_by_depth) <= depth:
+            self.nodes_by_depth.append(0)
+            self.lines_by_depth.append(0)
+        self.nodes_by_depth[depth] += 1
+        if depth > 0:
+            self.lines_by_depth[depth - 1] += lines_cleared
+
+    def count_first_block(self, block, seconds, nodes):
+        "Add the time and nodes spent below one first move"
+        key = "/".join("".join(str(cell) for cell in row) for row in block)
+        entry = self.first_blocks.setdefault(key, {"seconds": 0.0, "nodes": 0, "moves": 0})
+        entry["seconds"] += seconds
+        entry["nodes"] += nodes
+        entry["moves"] += 1
+
+    def to_dict(self):
+        "Export every counter as plain data"
+        return {
+            "seconds": self.seconds,
+            "nodes": sum(self.nodes_by_depth),
+            "nodes_by_depth": self.nodes_by_depth,
+            "lines_by_depth": self.lines_by_depth,
+            "placements_tried": self.placements_tried,
+            "placements_rejected": self.placements_rejected,
+            "commutation_skips": self.commutation_skips,
+            "transposition_hits": self.transposition_hits,
+            "fail_low_hits": self.fail_low_hits,
+            "bound_cutoffs": self.bound_cutoffs,
+            "settled_exits": self.settled_exits,
+            "dead_boards": self.dead_boards,
+            "first_blocks": self.first_blocks,
+        }
+
+    def to_json(self):
+        "Export every counter as JSON"
+        return json.dumps(self.to_dict())
+
+class TopPlacements:
+    "The k best distinct final boards of a search, pass one to find_best_placement to collect them"
+
+    def __init__(self, k=5):
+        self.k = k
+        self.results = [] # (score, remaining units, moves) best first, filled in by the search
+
+def can_place_block(grid, block, x, y):
+    "Check if a block can be placed at the given position"
+    for row_index, row in enumerate(block):
+        for col_index, cell in enumerate(row):
+            if cell == 1:
+                grid_x = x + col_index
+                grid_y = y + row_index
+
+                if (grid_x < 0 or grid_x >= len(grid[0]) or
+                    grid_y < 0 or grid_y >= len(grid) or
+                    grid[grid_y][grid_x] == 1): # Out of bounds or already filled
+                    return False
+    return True
+
+def place_block(grid, block, x, y):
+    "Place a block on the grid"
+    for row_index, row in enumerate(block):
+        for col_index, cell in enumerate(row):
+            if cell == 1:
+                grid[y + row_index][x + col_index] = 1
+
+def clear_lines(grid):
+    "Clear filled lines (rows and columns) in-place"
+    rows_to_clear = []
+    cols_to_clear = []
+
+    # Identify rows to clear
+    height, width = len(grid), len(grid[0])
+    for y in range(height):
+        if all(grid[y][x] == 1 for x in range(width)):
+            rows_to_clear.append(y)
+
+    # Identify columns to clear
+    for x in range(width):
+        if all(grid[y][x] == 1 for y in range(height)):
+            cols_to_clear.append(x)
+
+    # Clear rows (set to 0)
+    for y in rows_to_clear:
+        for x in range(width):
+            grid[y][x] = 0
+
+    # Clear columns (set to 0)
+    for x in cols_to_clear:
+        for y in range(height):
+            grid[y][x] = 0
+
+    return len(rows_to_clear) + len(cols_to_clear), rows_to_clear, cols_to_clear
+
+def remove_blank_lines(grid):
+    "Removes blank rows and columns to find the minimum bounding box of the blocks"
+
+    # Handle if the user doesn't enter a block
+    empty_grid = []
+    if all(all(cell == 0 for cell in row) for row in grid): 
+        return empty_grid
+
+    rows_to_remove = []
+    cols_to_remove = []
+
+    # Identify rows to remove from the top
+    for y in range(MAX_BLOCK_SIZE):
+        if all(grid[y][x] == 0 for x in range(MAX_BLOCK_SIZE)):
+            rows_to_remove.append(y)
+        else:
+            break
+
+    # Identify rows to remove from the bottom
+    for y in range(MAX_BLOCK_SIZE - 1, -1, -1): # Iterate in reverse
+        if all(grid[y][x] == 0 for x in range(MAX_BLOCK_SIZE)):
+            rows_to_remove.append(y)
+        else:
+            break
+
+    # Identify columns to remove from the left
+    for x in range(MAX_BLOCK_SIZE):
+        if all(grid[y][x] == 0 for y in range(MAX_BLOCK_SIZE)):
+            cols_to_remove.append(x)
+        else:
+            break
+    
+    # Identify columns to remove from the right
+    for x in range(MAX_BLOCK_SIZE - 1, -1, -1): # Iterate in reverse
+        if all(grid[y][x] == 0 for y in range(MAX_BLOCK_SIZE)):
+            cols_to_remove.append(x)
+        else:
+            break
+
+    # Remove rows (iterate in reverse)
+    for y in sorted(rows_to_remove, reverse=True):
+        del grid[y]
+
+    # Remove columns (iterate in reverse)
+    for row in grid:
+        for x in sorted(cols_to_remove, reverse=True):
+            del row[x]
+    
+    return grid
+    
+
+def group_blocks(blocks, layout=bitboard.DEFAULT_LAYOUT):
+    "Group identical blocks so each ordering is only searched once, returns (block, placements, cells) for each distinct block and how many of each there are"
+    unique_blocks = []
+    block_counts = []
+    for block in blocks:
+        for index, (unique_block, _, _) in enumerate(unique_blocks):
+            if unique_block == block:
+                block_counts[index] += 1
+                break
+        else:
+            unique_blocks.append((block, shapes.block_placements(block, layout), sum(map(sum, block)))) # Catalog shapes reuse their precomputed placement masks
+            block_counts.append(1)
+    return unique_blocks, tuple(block_counts)
+
+def legal_moves(board, unique_blocks, counts, layout=bitboard.DEFAULT_LAYOUT, first_index=0, stats=None):
+    "List every legal move as (lines cleared, new board, remaining block counts, move), the ones that clear the most lines first, counting skipped placements in stats"
+    # Blocks before first_index only get the moves that clear lines: moves that clear nothing can be played in any order,
+    # so the search only tries them in block order
+    moves = []
+    # A placement can only fill a line it covers with no more empty cells than the widest or tallest block left,
+    # so the ones that miss all of those lines skip the line check. Only a board given to the search can already have a full line
+    if bitboard.has_full_line(board, layout):
+        fillable = layout.full_board
+    else:
+        spans = [(len(block[0]), len(block)) for (block, _, _), count in zip(unique_blocks, counts) if count]
+        fillable = bitboard.reachable_lines(board, (max(width for width, _ in spans), max(height for _, height in spans)), layout)
+    for index, count in enumerate(counts):
+        if count == 0:
+            continue
+        block, placements, _ = unique_blocks[index]
+        next_counts = counts[:index] + (count - 1,) + counts[index + 1:]
+        if stats is not None:
+            stats.placements_tried += len(placements)
+        for x, y, mask in placements:
+            if board & mask == 0:
+                if mask & fillable:
+                    new_board, rows, cols = bitboard.clear_lines(board | mask, layout)
+                else:
+                    new_board, rows, cols = board | mask, [], []
+                lines_cleared = len(rows) + len(cols)
+                if lines_cleared == 0 and index < first_index:
+                    if stats is not None:
+                        stats.commutation_skips += 1
+                    continue
+                moves.append((lines_cleared, new_board, next_counts, (block, x, y, lines_cleared, rows, cols)))
+            elif stats is not None:
+                stats.placements_rejected += 1
+    moves.sort(key=lambda move: move[0], reverse=True)
+    return moves
+
+def cells_left(unique_blocks, counts):
+    "Count the cells in the blocks that are still to be placed"
+    return sum(count * unique_blocks[index][2] for index, count in enumerate(counts))
+
+@functools.lru_cache(maxsize=None)
+def _block_capacity(block, width, height):
+    "Most cells one block, given as a tuple of rows, puts into any r rows and c columns together, indexed [r][c]"
+    # Worked out over every choice of the block's own rows and columns, a row and a column it covers both share a cell
+    cells = [(x, y) for y, row in enumerate(block) for x, cell in enumerate(row) if cell]
+    block_height, block_width = len(block), len(block[0])
+    covered = [
+        [max(sum(1 for x, y in cells if y in rows or x in cols) for rows in itertools.combinations(range(block_height), row_count) for cols in itertools.combinations(range(block_width), col_count)) for col_count in range(block_width + 1)]
+        for row_count in range(block_height + 1)
+    ]
+    return [[covered[min(rows, block_height)][min(cols, block_width)] for cols in range(width + 1)] for rows in range(height + 1)]
+
+@functools.lru_cache(maxsize=4096)
+def _pieces_capacity(pieces, width, height):
+    "line_capacity of the pieces given as sorted (block as a tuple of rows, count) pairs, the same pieces come up again and again across searches"
+    capacity = [[0] * (width + 1) for _ in range(height + 1)]
+    for block, count in pieces:
+        block_capacity = _block_capacity(block, width, height)
+        capacity = [[total + count * cells for total, cells in zip(totals, row)] for totals, row in zip(capacity, block_capacity)]
+    return capacity
+
+def line_capacity(unique_blocks, counts, layout=bitboard.DEFAULT_LAYOUT):
+    "Most cells the blocks that are still to be placed can put into any r rows and c columns together, indexed [r][c]"
+    pieces = sorted((tuple(map(tuple, block)), count) for (block, _, _), count in zip(unique_blocks, counts) if count)
+    return _pieces_capacity(tuple(pieces), layout.width, layout.height)
+
+class LineCapacities:
+    "line_capacity tables of the remaining blocks by block counts, only a few counts ever come up in a search so each is kept"
+
+    def __init__(self, unique_blocks, layout=bitboard.DEFAULT_LAYOUT):
+        self.unique_blocks = unique_blocks
+        self.layout = layout
+        self.tables = {} # Remaining block counts -> line_capacity table
+
+    def __getitem__(self, counts):
+        if counts not in self.tables:
+            self.tables[counts] = line_capacity(self.unique_blocks, counts, self.layout)
+        return self.tables[counts]
+
+class IdleBounds:
+    "Bounds after the moves from one board that touch none of the lines the remaining blocks could still fill"
+    # Such a move leaves those lines as they are, so every one of them of one block leads to the same bound, worked out once per block
+
+    def __init__(self, board, counts, capacities):
+        capacity = capacities[counts]
+        self.board = board
+        self.capacities = capacities
+        self.open_lines = bitboard.reachable_lines(board, (capacity[1][0], capacity[0][1]), capacities.layout)
+        self.bounds = {} # Remaining block counts after the move -> bound
+
+    def get(self, new_board, next_counts):
+        "Bound after a move, or None if it touches one of the open lines"
+        if (new_board ^ self.board) & self.open_lines:
+            return None
+        if next_counts not in self.bounds:
+            capacities = self.capacities
+            cells = cells_left(capacities.unique_blocks, next_counts)
+            self.bounds[next_counts] = bitboard.max_lines_cleared(self.board, cells, capacities.layout, capacities[next_counts])
+        return self.bounds[next_counts]
+
+def last_block_moves(board, unique_blocks, counts, layout=bitboard.DEFAULT_LAYOUT, first_index=0):
+    "Yield (lines cleared, new board, move) for every legal placement of the one block left, without building the move list"
+    index = counts.index(1)
+    block, placements, _ = unique_blocks[index]
+    for x, y, mask in placements:
+        if board & mask:
+            continue
+        new_board, rows, cols = bitboard.clear_lines(board | mask, layout)
+        lines_cleared = len(rows) + len(cols)
+        if lines_cleared == 0 and index < first_index:
+            continue
+        yield lines_cleared, new_board, (block, x, y, lines_cleared, rows, cols)
+
+def first_block_after(counts, next_counts, lines_cleared):
+    "First block index the next move that clears nothing may use: any block after a clearing move, else the one just placed or later"
+    return 0 if lines_cleared else next(index for index, count in enumerate(counts) if count != next_counts[index])
+
+def is_dead(board, unique_blocks, counts, fits, layout=bitboard.DEFAULT_LAYOUT):
+    "Check if some remaining block can never fit, given fit_table of every distinct block: it fits nowhere now and no line the other blocks could clear first frees enough room"
+    empty = layout.full_board & ~board
+    anchors = [bitboard.fitting_anchors(empty, fit) if count else None for fit, count in zip(fits, counts)]
+    if all(anchors): # Every remaining block fits somewhere, the common case
+        return False
+    cells = cells_left(unique_blocks, counts)
+    for index, count in enumerate(counts):
+        if anchors[index] != 0:
+            continue
+        # Only the other blocks can fill a line before this one goes down, and nothing is freed before the first clear,
+        # so the first line cleared has to be filled by placements that fit on the board as it is now
+        reach = cells - unique_blocks[index][2]
+        coverable = 0
+        for other, other_count in enumerate(counts):
+            if other_count > (other == index):
+                coverable |= bitboard.covered_cells(anchors[other], fits[other])
+        if not bitboard.fillable_lines(board, reach, layout, coverable):
+            return True
+        if not bitboard.fitting_anchors(empty | bitboard.fillable_lines(board, reach, layout), fits[index]): # Not even if every line in reach were cleared
+            return True
+    return False
+
+def fewest_units(units, cells, score, layout=bitboard.DEFAULT_LAYOUT):
+    "Lower bound on the units left after placing the given cells on a board with the given units and clearing score lines, a line frees at most a full line of cells"
+    return units + cells - score * max(layout.width, layout.height)
+
+def trim_table(table, max_entries=MAX_TABLE_ENTRIES):
+    "Drop the older half of a table that has grown past max_entries, dicts keep insertion order"
+    if len(table) > max_entries:
+        for key in list(itertools.islice(table, len(table) // 2)):
+            del table[key]
+
+def final_board(board, moves, layout=bitboard.DEFAULT_LAYOUT):
+    "Replay a move sequence on a bitboard, returns the board after the last move"
+    for block, x, y, _, _, _ in moves:
+        board, _, _ = bitboard.clear_lines(board | bitboard.block_mask(block, x, y, layout), layout)
+    return board
+
+def is_better(score, remaining_units, best):
+    "Check if a result beats the best so far: higher score, or same score with less remaining units"
+    return best is None or score > best[0] or (score == best[0] and remaining_units < best[1])
+
+def make_search(unique_blocks, progress=None, stats=None, evaluator=None, layout=bitboard.DEFAULT_LAYOUT):
+    "Build the recursive search over the given distinct blocks, with its own transposition tables"
+    # An evaluator (see features.BoardFeatures) follows the search with push/pop and its cost() replaces the remaining units
+
+    def solve(board, counts, floor, depth=0, first_index=0):
+        "Recursive helper function, returns (score, remaining units, moves) for the best way to place the remaining blocks, or None if it can't score at least floor"
+        if progress is not None:
+            progress.visit()
+        if len(transpositions) > MAX_TABLE_ENTRIES or len(fail_lows) > MAX_TABLE_ENTRIES: # Keep memory bounded on long searches
+            trim_table(transpositions)
+            trim_table(fail_lows)
+        key = (board, counts, first_index)
+        if key in transpositions: # Already searched this board with the same blocks left
+            if stats is not None:
+                stats.transposition_hits += 1
+            return transpositions[key]
+        if fail_lows.get(key, float('inf')) <= floor: # Already known to score less than floor
+            if stats is not None:
+                stats.fail_low_hits += 1
+            return None
+
+        if not any(counts): # Base case: all blocks placed
+            best = (0, bitboard.count_units(board) if evaluator is None else evaluator.cost(), [])
+            transpositions[key] = best
+            return best
+
+        cells = cells_left(unique_blocks, counts)
+        bound = bitboard.max_lines_cleared(board, cells, layout, capacities[counts])
+        if bound < floor: # Can't reach floor even in the best case
+            if stats is not None:
+                stats.bound_cutoffs += 1
+            fail_lows[key] = floor
+            return None
+
+        last_block = sum(counts) == 1
+        if not last_block and is_dead(board, unique_blocks, counts, fits, layout): # Some block will never fit, nothing below can place them all
+            if stats is not None:
+                stats.dead_boards += 1
+            fail_lows[key] = 0
+            return None
+
+        best = None
+        units = bitboard.count_units(board) if evaluator is None else None # The evaluator's cost has no such lower bound, so ties are always searched then
+        if last_block and stats is None and evaluator is None: # Score the last block's placements directly
+            for lines_cleared, new_board, move in last_block_moves(board, unique_blocks, counts, layout, first_index):
+                new_units = bitboard.count_units(new_board)
+                if is_better(lines_cleared, new_units, best):
+                    best = (lines_cleared, new_units, [move])
+                    if depth == 0 and progress is not None:
+                        progress.best = best
+                    if lines_cleared == bound and new_units <= fewest_units(units, cells, bound, layout): # No placement can do better
+                        break
+            return store(key, best, floor)
+
+        moves = legal_moves(board, unique_blocks, counts, layout, first_index, stats)
+        idle_bounds = IdleBounds(board, counts, capacities) if not last_block else None
+        needed = floor # Anything scoring less than this can't win
+        for lines_cleared, new_board, next_counts, move in moves:
+            if idle_bounds is not None and needed > 0:
+                idle_bound = idle_bounds.get(new_board, next_counts)
+                if idle_bound is not None and idle_bound < needed:
+                    if stats is not None:
+                        stats.bound_cutoffs += 1
+                    continue
+            if stats is not None:
+                stats.count_node(depth + 1, lines_cleared)
+                if depth == 0:
+                    first_move_start = time.perf_counter()
+                    first_move_nodes = sum(stats.nodes_by_depth)
+            if evaluator is not None:
+                evaluator.push(new_board)
+            if last_block: # Score the final board directly instead of recursing into the base case
+                result = (0, bitboard.count_units(new_board) if evaluator is None else evaluator.cost(), [])
+            else:
+                # After a move that clears nothing, the next one that clears nothing can't use an earlier block
+                next_first = first_block_after(counts, next_counts, lines_cleared)
+                result = solve(new_board, next_counts, max(0, needed - lines_cleared), depth + 1, next_first) # Recursive call
+            if evaluator is not None:
+                evaluator.pop()
+            if stats is not None and depth == 0:
+                stats.count_first_block(move[0], time.perf_counter() - first_move_start, sum(stats.nodes_by_depth) - first_move_nodes)
+            if result is None: # The other blocks can't all be placed after this move, or can't score enough
+                continue
+            if is_better(result[0] + lines_cleared, result[1], best):
+                best = (result[0] + lines_cleared, result[1], [move] + result[2])
+                if depth == 0 and progress is not None: # Publish the best full sequence so far
+                    progress.best = best
+                settled = units is not None and best[1] <= fewest_units(units, cells, best[0], layout)
+                if settled and best[0] == bound: # Nothing can beat it, with bound 0 the first full sequence stands
+                    if stats is not None:
+                        stats.settled_exits += 1
+                    break
+                needed = max(floor, best[0] + settled) # Neither can a tie once the best has the fewest units its score allows
+
+        return store(key, best, floor)
+
+    def store(key, best, floor):
+        "Remember a node's result, a best below floor is only known to fall short since the branches that could beat it were cut"
+        if best is None or best[0] < floor:
+            fail_lows[key] = floor
+            return None
+        transpositions[key] = best
+        return best
+
+    fits = [bitboard.fit_table(block, placements, layout) for block, placements, _ in unique_blocks] # For the dead board check
+    transpositions = {} # (board, remaining block counts, first block index) -> best result from that node
+    fail_lows = {} # (board, remaining block counts, first block index) -> lowest floor the node is known to fall short of
+    capacities = LineCapacities(unique_blocks, layout)
+    return solve
+
+def search_top(board, unique_blocks, counts, k, progress=None, stats=None, layout=bitboard.DEFAULT_LAYOUT):
+    "Depth-first search keeping the k best distinct final boards, returns [(score, remaining units, moves)] best first"
+    kept = [] # Min-heap of (score, -remaining units, -discovery order, final board, moves), the worst kept outcome on top
+    kept_scores = {} # Final board -> score it is kept with, so orderings that end on the same board count once
+    arrivals = {} # (board, remaining block counts, first block index) -> (best score the search has reached it with, most lines reachable below it)
+    capacities = LineCapacities(unique_blocks, layout)
+    discovery = itertools.count()
+    fits = [bitboard.fit_table(block, placements, layout) for block, placements, _ in unique_blocks]
+
+    def cannot_place(score, units, cells, lines):
+        "Check if ending lines more from here can't get into the heap, a tie on score also needs fewer units than the worst kept"
+        if len(kept) < k:
+            return False
+        worst_score, worst_units = kept[0][0], -kept[0][1]
+        return score + lines < worst_score or score + lines == worst_score and fewest_units(units, cells, lines, layout) >= worst_units
+
+    def offer(board, score, moves):
+        "Offer a final board to the heap"
+        if kept_scores.get(board, -1) >= score: # Same board already kept at least as well
+            return
+        units = bitboard.count_units(board)
+        entry = (score, -units, -next(discovery), board, moves)
+        if board in kept_scores: # Reached the same board with a higher score, replace it
+            kept[:] = [old for old in kept if old[3] != board]
+            heapq.heapify(kept)
+        if len(kept) < k:
+            heapq.heappush(kept, entry)
+        elif entry > kept[0]:
+            del kept_scores[heapq.heapreplace(kept, entry)[3]]
+        else:
+            return
+        kept_scores[board] = score
+        if progress is not None and is_better(score, units, progress.best): # Publish the best full sequence so far
+            progress.best = (score, units, moves)
+
+    def visit(board, counts, score, moves, first_index=0):
+        "Recursive helper function, offers every final board reachable from here to the heap, returns the most lines reachable below or -1 if the blocks can't all be placed"
+        if progress is not None:
+            progress.visit()
+        if not any(counts): # All blocks placed
+            offer(board, score, moves)
+            return 0
+
+        trim_table(arrivals)
+        key = (board, counts, first_index)
+        units = bitboard.count_units(board)
+        cells = cells_left(unique_blocks, counts)
+        if key in arrivals:
+            best_score, ceiling = arrivals[key]
+            if best_score >= score: # Everything below was already offered with at least this score
+                if stats is not None:
+                    stats.transposition_hits += 1
+                return ceiling
+            if ceiling < 0 or cannot_place(score, units, cells, ceiling): # Known to fall short even with this higher score
+                if stats is not None:
+                    stats.fail_low_hits += 1
+                arrivals[key] = (score, ceiling)
+                return ceiling
+        last_block = sum(counts) == 1
+        if not last_block and is_dead(board, unique_blocks, counts, fits, layout): # Some block will never fit
+            if stats is not None:
+                stats.dead_boards += 1
+            arrivals[key] = (score, -1)
+            return -1
+        bound = bitboard.max_lines_cleared(board, cells, layout, capacities[counts])
+        if cannot_place(score, units, cells, bound): # Can't reach the k-th best
+            if stats is not None:
+                stats.bound_cutoffs += 1
+            arrivals[key] = (score, bound)
+            return bound
+
+        ceiling = -1
+        if last_block and stats is None: # Offer the last block's placements directly
+            for lines_cleared, new_board, move in last_block_moves(board, unique_blocks, counts, layout, first_index):
+                offer(new_board, score + lines_cleared, moves + [move])
+                ceiling = max(ceiling, lines_cleared)
+            arrivals[key] = (score, ceiling)
+            return ceiling
+
+        idle_bounds = IdleBounds(board, counts, capacities)
+        for lines_cleared, new_board, next_counts, move in legal_moves(board, unique_blocks, counts, layout, first_index, stats):
+            idle_bound = idle_bounds.get(new_board, next_counts)
+            if idle_bound is not None and cannot_place(score, units, cells, idle_bound): # Placing cells from the blocks onto the board leaves units plus cells as they were
+                if stats is not None:
+                    stats.bound_cutoffs += 1
+                ceiling = max(ceiling, idle_bound)
+                continue
+            if stats is not None:
+                stats.count_node(len(moves) + 1, lines_cleared)
+            # After a move that clears nothing, the next one that clears nothing can't use an earlier block
+            below = visit(new_board, next_counts, score + lines_cleared, moves + [move], first_block_after(counts, next_counts, lines_cleared))
+            if below >= 0:
+                ceiling = max(ceiling, lines_cleared + below)
+        arrivals[key] = (score, ceiling)
+        return ceiling
+
+    try:
+        visit(board, counts, 0, [])
+    except SearchCancelled: # Stopped early, keep what was found so far
+        pass
+    return [(score, -negative_units, moves) for score, negative_units, _, _, moves in sorted(kept, reverse=True)]
+
+def find_best_placement(grid, blocks, progress=None, stats=None, evaluator=None, top=None):
+    "Find the best placement using recursion over bitboards, pass a SearchProgress to follow or stop the search, a SearchStats to profile it and an evaluator to break ties"
+    # With a TopPlacements the k best distinct final boards are collected in one pass (the evaluator isn't used then).
+    # The board size comes from the grid, any number of blocks works since the search follows which blocks are left, not their order
+    layout = bitboard.grid_layout(grid)
+    if evaluator is not None and (len(grid) != GRID_SIZE or len(grid[0]) != GRID_SIZE): # The features are built on the default board's masks
+        raise ValueError(f"evaluator only supports the {GRID_SIZE}x{GRID_SIZE} board")
+    unique_blocks, block_counts = group_blocks(blocks, layout)
+    board = bitboard.grid_to_board(grid)
+    if stats is not None:
+        stats.count_node(0)
+        start = time.perf_counter()
+    if progress is not None:
+        progress.start()
+    if top is not None:
+        top.results = search_top(board, unique_blocks, block_counts, top.k, progress, stats, layout) # Keeps the boards found so far if cut off
+        best = top.results[0] if top.results else None
+    else:
+        solve = make_search(unique_blocks, progress, stats, evaluator, layout)
+        if evaluator is not None:
+            evaluator.reset(board)
+        try:
+            best = solve(board, block_counts, 0)
+        except SearchCancelled: # Stopped early, fall back on the best sequence found so far
+            best = progress.best
+    if progress is not None:
+        progress.done = True
+    if stats is not None:
+        stats.seconds += time.perf_counter() - start
+
+    if best is None: # Handle no valid moves
+        return 0, 0, []
+    best_score, _, best_move_sequence = best
+    return best_score, len(best_move_sequence), best_move_sequence
@@ -0,0 +1,225 @@
+# Block Blast Calc solver service by Kozurito
+# Local HTTP/JSON endpoint for the solver, standard library only. Runs find_best_placement on a process pool,
+# shares one computation between concurrent requests for the same canonical position and keeps recent results in memory
+#
+#   python solver_service.py --port 8765
+#   POST /solve    {"grid": [[0, 1, ...], ...], "blocks": [[[1, 1], [1, 0]], ...]} -> same record as batch_solve.py
+#   GET  /metrics  request counters, latency percentiles and throughput
+#   GET  /health   {"ok": true}
+import argparse
+import asyncio
+import collections
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+import solver
+from opening_book import OpeningBook
+from batch_solve import parse_grid, parse_block, format_solution
+from solution_cache import canonical_form, canonical_puzzle, restore_orientation
+
+HOST = "127.0.0.1" # Localhost only
+PORT = 8765
+REQUEST_TIMEOUT = 30.0 # Seconds a request waits for its answer
+CACHE_SIZE = 4096 # Results kept in memory
+LATENCY_SAMPLES = 10000 # Recent latencies kept for the percentiles
+THROUGHPUT_WINDOW = 60.0 # Seconds of recent requests the throughput is measured over
+MAX_BODY_BYTES = 1 << 20
+
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error", 504: "Gateway Timeout"}
+
+def solve_within(grid, blocks, deadline):
+    "Run find_best_placement in a pool worker until a time.time() deadline, returns (result, whether the search finished)"
+    # Stopping at the request's deadline frees the worker instead of finishing work nobody is waiting for
+    progress = solver.SearchProgress(max(0.0, deadline - time.time()))
+    result = solver.find_best_placement(grid, blocks, progress)
+    return result, not progress.timed_out
+
+class ServiceMetrics:
+    "Request counters, recent latencies and recent completion times"
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counters = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.completions = collections.deque()
+
+    def record(self, outcome, seconds):
+        "Count one finished request"
+        now = time.monotonic()
+        self.counters["requests"] += 1
+        self.counters[outcome] += 1
+        self.latencies.append(seconds)
+        self.completions.append(now)
+        while self.completions and self.completions[0] < now - THROUGHPUT_WINDOW:
+            self.completions.popleft()
+
+    def to_dict(self):
+        "Counters, latency percentiles in milliseconds and requests per second"
+        uptime = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+        def percentile(fraction):
+            return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else 0.0
+        while self.completions and self.completions[0] < time.monotonic() - THROUGHPUT_WINDOW:
+            self.completions.popleft()
+        return {
+            "uptime_seconds": uptime,
+            "counters": dict(self.counters),
+            "latency_ms": {"p50": percentile(0.5), "p90": percentile(0.9), "p99": percentile(0.99), "max": latencies[-1] * 1000 if latencies else 0.0},
+            "requests_per_second": len(self.completions) / min(uptime, THROUGHPUT_WINDOW) if uptime else 0.0,
+            "lifetime_requests_per_second": self.counters["requests"] / uptime if uptime else 0.0,
+        }
+
+class SolverService:
+    "Solves positions on a process pool, coalescing duplicate work and caching recent results"
+
+    def __init__(self, workers=None, cache_size=CACHE_SIZE, timeout=REQUEST_TIMEOUT, book=None):
+        self.book = book # OpeningBook answering covered positions without touching the pool
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.results = collections.OrderedDict() # Canonical key -> canonical result, oldest first
+        self.pending = {} # Canonical key -> future of the computation in flight
+        self.metrics = ServiceMetrics()
+
+    async def solve(self, grid, blocks):
+        "Find the best placement for a position, returns (result, outcome) where outcome is book, cached, coalesced or computed"
+        key, symmetry = canonical_form(grid, blocks)
+        result = self.book.lookup(key) if self.book is not None else None
+        if result is not None:
+            outcome = "book"
+        elif key in self.results:
+            self.results.move_to_end(key)
+            result, outcome = self.results[key], "cached"
+        else:
+            future = self.pending.get(key)
+            outcome = "coalesced" if future else "computed"
+            if future is None:
+                deadline = time.time() + self.timeout
+                future = asyncio.get_running_loop().run_in_executor(self.executor, solve_within, *canonical_puzzle(grid, blocks, symmetry), deadline)
+                self.pending[key] = future
+                future.add_done_callback(lambda done: self._finish(key, done))
+            # Shielded so one caller timing out doesn't cancel the computation the others are waiting on
+            result, finished = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+            if not finished: # Stopped at the deadline, the best found so far may not be the answer
+                raise asyncio.TimeoutError
+        best_score, best_moves, canonical_sequence = result
+        return (best_score, best_moves, restore_orientation(canonical_sequence, symmetry, blocks)), outcome
+
+    def _finish(self, key, future):
+        "Move a finished computation from the pending table to the LRU, even if every caller gave up on it"
+        del self.pending[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        result, finished = future.result()
+        if not finished: # Cut off at the deadline
+            return
+        self.results[key] = result
+        while len(self.results) > self.cache_size:
+            self.results.popitem(last=False)
+
+    async def handle_solve(self, body):
+        "Answer one POST /solve, returns (status, record, outcome)"
+        try:
+            puzzle = json.loads(body)
+            grid = parse_grid(puzzle["grid"])
+            blocks = [parse_block(block) for block in puzzle["blocks"]]
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {"error": str(error)}, "bad_request"
+        try:
+            best, outcome = await self.solve(grid, blocks)
+        except asyncio.TimeoutError:
+            return 504, {"error": f"no answer within {self.timeout}s"}, "timeout"
+        except Exception as error: # A worker raised or the pool broke, answer instead of dropping the connection
+            return 500, {"error": f"{type(error).__name__}: {error}"}, "error"
+        record = format_solution(*best)
+        if "id" in puzzle:
+            record["id"] = puzzle["id"]
+        record["source"] = outcome
+        return 200, record, outcome
+
+    async def handle_connection(self, reader, writer):
+        "Serve HTTP/1.1 requests on one connection until the client closes it"
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+
+                start = time.perf_counter()
+                path = path.split("?", 1)[0]
+                if path == "/solve":
+                    status, record, outcome = await self.handle_solve(body) if method == "POST" else (405, {"error": "use POST"}, "bad_request")
+                    self.metrics.record(outcome, time.perf_counter() - start)
+                elif path == "/metrics" and method == "GET":
+                    status, record = 200, dict(self.metrics.to_dict(), cache_entries=len(self.results), in_flight=len(self.pending))
+                elif path == "/health" and method == "GET":
+                    status, record = 200, {"ok": True}
+                else:
+                    status, record = 404, {"error": f"no route for {method} {path}"}
+                await self.respond(writer, status, record, keep_alive)
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError): # Malformed request line, header or body
+            await self.respond(writer, 400, {"error": "malformed request"}, False)
+        except ConnectionError: # Client went away
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, record, keep_alive):
+        "Write one JSON response"
+        body = json.dumps(record).encode()
+        head = (
+            f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    def close(self):
+        "Shut the worker processes down"
+        self.executor.shutdown(cancel_futures=True)
+
+async def serve(service, host=HOST, port=PORT):
+    "Run the HTTP server until cancelled"
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Solving on http://{host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+def main(argv=None):
+    "Command line entry point"
+    parser = argparse.ArgumentParser(description="Serve the solver over HTTP/JSON on localhost.")
+    parser.add_argument("-p", "--port", type=int, default=PORT, help=f"port to listen on (default {PORT})")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="solver processes (default 0, one per CPU)")
+    parser.add_argument("--cache-size", type=int, default=CACHE_SIZE, help=f"results kept in memory (default {CACHE_SIZE})")
+    parser.add_argument("-b", "--book", help="opening book to answer covered positions from, see opening_book.py")
+    parser.add_argument("-t", "--timeout", type=float, default=REQUEST_TIMEOUT, help=f"seconds a request waits for its answer (default {REQUEST_TIMEOUT})")
+    args = parser.parse_args(argv)
+
+    service = SolverService(args.workers or None, args.cache_size, args.timeout, OpeningBook(args.book) if args.book else None)
+    try:
+        asyncio.run(serve(service, port=args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Block Blast Calc board feature tests by Kozurito
+# Incremental push/pop updates have to match the features of a fresh BoardFeatures on the same board
+import random
+import bitboard
+import shapes
+from features import BoardFeatures
+
+DIAGONALS = [[[1, 0], [0, 1]], [[0, 1], [1, 0]], [[1, 0, 0], [0, 1, 0], [0, 0, 1]], [[0, 0, 1], [0, 1, 0], [1, 0, 0]]]
+
+def assert_matches_fresh(features):
+    "Every feature equals the one computed from scratch for the same board"
+    fresh = BoardFeatures(features.board)
+    assert features.features() == fresh.features()
+    assert features.fits == fresh.fits
+    assert features.hole_mask == fresh.hole_mask
+
+def random_board(rng, density):
+    "A board with no full lines, like any board the game shows"
+    board = 0
+    for cell in range(bitboard.GRID_SIZE * bitboard.GRID_SIZE):
+        if rng.random() < density:
+            board |= 1 << cell
+    return bitboard.clear_lines(board)[0]
+
+def test_diagonal_fills_two_holes():
+    "A diagonal block filling two separate one cell holes removes both regions"
+    board = bitboard.FULL_BOARD & ~(1 << 0) & ~(1 << 9) # Holes at (0, 0) and (1, 1)
+    features = BoardFeatures(board)
+    assert features.regions == 2
+    features.push(bitboard.FULL_BOARD)
+    assert features.regions == 0
+    assert_matches_fresh(features)
+
+def test_push_pop_match_recomputation():
+    "Random move sequences, diagonal shapes included, agree with recomputation after every push and pop"
+    rng = random.Random(0)
+    pieces = shapes.SHAPES + DIAGONALS
+    for _ in range(300):
+        features = BoardFeatures(random_board(rng, rng.choice([0.2, 0.4, 0.6])))
+        boards = [features.board]
+        for _ in range(6):
+            moves = [mask for piece in rng.sample(pieces, 6) for _, _, mask in bitboard.block_placements(piece) if not features.board & mask]
+            if not moves:
+                break
+            features.push(bitboard.clear_lines(features.board | rng.choice(moves))[0])
+            boards.append(features.board)
+            assert_matches_fresh(features)
+        while len(boards) > 1:
+            features.pop()
+            boards.pop()
+            assert features.board == boards[-1]
+            assert_matches_fresh(features)
@@ -0,0 +1,23 @@
+# Block Blast Calc parallel solver tests by Kozurito
+import random
+import bitboard
+import shapes
+import solver
+from parallel_solver import ParallelSolver
+
+def outcome(grid, result):
+    "Score and remaining units of a find_best_placement result"
+    score, _, moves = result
+    layout = bitboard.grid_layout(grid)
+    return score, bitboard.count_units(solver.final_board(bitboard.grid_to_board(grid), moves, layout))
+
+def test_parallel_matches_serial():
+    rng = random.Random(6)
+    positions = [([[0] * 8 for _ in range(8)], [[[1, 1, 1, 1, 1]], [[1, 1, 1]], [[1], [1]]])] # Settles on the first full line
+    for fill in (0.3, 0.45, 0.6):
+        for size in (8, 8, 10):
+            grid = [[int(rng.random() < fill) for _ in range(size)] for _ in range(size)]
+            positions.append((grid, [rng.choice(shapes.SHAPES) for _ in range(3)]))
+    with ParallelSolver(workers=2) as parallel_solver:
+        for grid, blocks in positions:
+            assert outcome(grid, parallel_solver.find_best_placement(grid, blocks)) == outcome(grid, solver.find_best_placement(grid, blocks))
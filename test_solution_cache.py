@@ -0,0 +1,38 @@
+# Block Blast Calc solution cache tests by Kozurito
+import random
+import shapes
+import solver
+from solution_cache import SYMMETRIES, SolutionCache, transform_grid
+
+def test_replacing_a_key_keeps_the_entry_count(tmp_path):
+    with SolutionCache(str(tmp_path / "cache.db"), max_entries=2) as cache:
+        for _ in range(3):
+            cache.store("a", [0, 0, []])
+        cache.store("b", [0, 0, []])
+        assert cache.entries == 2
+        assert cache.connection.execute("SELECT COUNT(*) FROM solutions").fetchone()[0] == 2
+
+def test_eviction_drops_the_least_recently_used(tmp_path):
+    with SolutionCache(str(tmp_path / "cache.db"), max_entries=2) as cache:
+        for key in "abc":
+            cache.store(key, [0, 0, []])
+        keys = {row[0] for row in cache.connection.execute("SELECT key FROM solutions")}
+        assert cache.entries == 2 and keys == {"b", "c"}
+
+def test_cached_moves_replay_on_every_orientation(tmp_path):
+    rng = random.Random(23) # Its best sequence clears both a row and a column
+    grid = [[int(rng.random() < 0.5) for _ in range(8)] for _ in range(8)]
+    blocks = [rng.choice(shapes.SHAPES[:20]) for _ in range(3)]
+    with SolutionCache(str(tmp_path / "cache.db")) as cache:
+        for symmetry in SYMMETRIES:
+            variant_grid = transform_grid(grid, symmetry)
+            variant_blocks = [transform_grid(block, symmetry) for block in blocks]
+            best_score, best_moves, moves = cache.find_best_placement(variant_grid, variant_blocks)
+            assert best_score == 3 and best_moves == len(moves) == 3
+            replay = [row[:] for row in variant_grid]
+            for block, x, y, lines_cleared, rows, cols in moves:
+                assert block in variant_blocks
+                assert solver.can_place_block(replay, block, x, y)
+                solver.place_block(replay, block, x, y)
+                assert solver.clear_lines(replay) == (lines_cleared, rows, cols)
+        assert cache.misses == 1 and cache.hits == len(SYMMETRIES) - 1
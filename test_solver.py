@@ -0,0 +1,60 @@
+# Block Blast Calc solver tests by Kozurito
+import random
+import pytest
+import bitboard
+import features
+import shapes
+import solver
+
+def test_placement_counters_add_up():
+    rng = random.Random(10)
+    board = sum(1 << cell for cell in range(64) if rng.random() < 0.3)
+    blocks = [[[1, 1, 1]], [[1, 0], [1, 1]], [[1], [1]]]
+    unique_blocks, counts = solver.group_blocks(blocks, bitboard.DEFAULT_LAYOUT)
+    stats = solver.SearchStats()
+    moves = solver.legal_moves(board, unique_blocks, counts, first_index=2, stats=stats)
+    overlapping = sum(bool(board & mask) for _, placements, _ in unique_blocks for _, _, mask in placements)
+    assert stats.placements_tried == sum(len(placements) for _, placements, _ in unique_blocks)
+    assert stats.placements_rejected == overlapping
+    assert stats.commutation_skips > 0
+    assert stats.placements_tried == stats.placements_rejected + stats.commutation_skips + len(moves)
+
+def test_evaluator_needs_the_default_board():
+    grid = [[0] * 10 for _ in range(10)]
+    with pytest.raises(ValueError):
+        solver.find_best_placement(grid, [[[1]]], evaluator=features.BoardFeatures())
+
+def all_final_boards(board, blocks, layout):
+    "Every distinct final board by brute force, mapped to the best score that reaches it"
+    finals = {}
+    seen = set()
+    def walk(board, remaining, score):
+        if (board, remaining, score) in seen:
+            return
+        seen.add((board, remaining, score))
+        if not remaining:
+            finals[board] = max(score, finals.get(board, -1))
+            return
+        for index in remaining:
+            for _, _, mask in bitboard.block_placements(blocks[index], layout):
+                if board & mask == 0:
+                    new_board, rows, cols = bitboard.clear_lines(board | mask, layout)
+                    walk(new_board, remaining - {index}, score + len(rows) + len(cols))
+    walk(board, frozenset(range(len(blocks))), 0)
+    return finals
+
+@pytest.mark.parametrize("seed", range(6))
+def test_top_placements_match_brute_force(seed):
+    rng = random.Random(seed)
+    grid = [[int(rng.random() < 0.4) for _ in range(8)] for _ in range(8)]
+    blocks = [rng.choice(shapes.SHAPES) for _ in range(3)]
+    layout = bitboard.grid_layout(grid)
+    board = bitboard.grid_to_board(grid)
+    finals = all_final_boards(board, blocks, layout)
+    expected = sorted(((score, bitboard.count_units(final)) for final, score in finals.items()), key=lambda result: (-result[0], result[1]))[:4]
+    top = solver.TopPlacements(4)
+    solver.find_best_placement(grid, blocks, top=top)
+    assert [(score, units) for score, units, _ in top.results] == expected
+    boards = [solver.final_board(board, moves, layout) for _, _, moves in top.results]
+    assert len(set(boards)) == len(boards)
+    assert all(finals[final] == score for final, (score, _, _) in zip(boards, top.results))
@@ -0,0 +1,26 @@
+# Block Blast Calc solver service tests by Kozurito
+import asyncio
+import json
+import time
+from solver_service import SolverService, solve_within
+
+def test_worker_error_answers_500():
+    service = SolverService(workers=1)
+    async def broken_solve(grid, blocks):
+        raise RuntimeError("worker died")
+    service.solve = broken_solve
+    body = json.dumps({"grid": [[0] * 8 for _ in range(8)], "blocks": [[[1]]]}).encode()
+    try:
+        status, record, outcome = asyncio.run(service.handle_solve(body))
+    finally:
+        service.close()
+    assert status == 500 and outcome == "error"
+    assert "worker died" in record["error"]
+
+def test_job_stops_at_its_deadline():
+    # An empty 10x10 board with these five blocks takes close to a minute to solve in full
+    grid = [[0] * 10 for _ in range(10)]
+    blocks = [[[1, 1], [1, 1], [1, 1]], [[1], [1], [1], [1]], [[1, 1, 1], [1, 1, 1]], [[0, 0, 1], [0, 0, 1], [1, 1, 1]], [[0, 1], [0, 1], [1, 1]]]
+    start = time.monotonic()
+    _, finished = solve_within(grid, blocks, time.time() + 0.2)
+    assert not finished and time.monotonic() - start < 5